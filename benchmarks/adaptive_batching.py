@@ -0,0 +1,157 @@
+"""
+Latency/throughput trade-off of the fixed and the adaptive (AIMD) upload batching under synthetic load.
+
+Simulates stream readers, the shared buffer, the sender and a backend on a virtual clock, so a run takes seconds
+and is deterministic. The backend answers in a base latency plus a per-row cost, rejects batches over its payload
+limit with 413, and answers 503 while more rows arrive than it can ingest per second.
+
+    python benchmarks/adaptive_batching.py [--duration 120]
+
+Delivery latency is the time from a line being written by a container to its batch being acknowledged.
+"""
+import argparse
+import os
+import sys
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from src.services.batching import RATE_SMOOTHING, AdaptiveBatching  # noqa: E402
+
+STEP = 0.005  # Seconds per simulation step
+STREAMS = 20
+
+
+class FixedBatching:
+    """
+    The previous hard-coded behaviour: flush readers at 50 lines or 1s, upload 100 rows, sleep 1s when idle
+    and 5s after a failure.
+    """
+    batch_size = 100
+    flush_interval = 1.0
+
+    def __init__(self):
+        self.backoff = 5.0
+
+    def flush_rows(self, rate: float) -> int:
+        return 50
+
+    def on_upload(self, latency: float, status: int | None, full: bool):
+        pass
+
+    def on_idle(self):
+        pass
+
+
+class Backend:
+    def __init__(self, base_latency: float, row_cost: float, capacity: float, max_rows: int):
+        self.base_latency = base_latency
+        self.row_cost = row_cost
+        self.capacity = capacity  # Rows per second
+        self.max_rows = max_rows
+        self.accepted = deque()  # (time, rows) of the last second
+
+    def upload(self, now: float, rows: int) -> tuple[float, int]:
+        """
+        :return: (latency, status)
+        """
+        if rows > self.max_rows:
+            return self.base_latency, 413
+        while self.accepted and self.accepted[0][0] < now - 1:
+            self.accepted.popleft()
+        if sum(r for _, r in self.accepted) + rows > self.capacity:
+            return self.base_latency, 503
+        self.accepted.append((now, rows))
+        return self.base_latency + self.row_cost * rows, 200
+
+
+# Profiles: (name, lines per second of stream i at time t, backend factory)
+PROFILES = [
+    ("quiet", lambda i, t: 0.2, lambda t: (0.05, 0.0002)),
+    ("steady", lambda i, t: 50, lambda t: (0.05, 0.0002)),
+    ("storm", lambda i, t: 2000 if i < 5 and 20 <= t % 60 < 40 else 50, lambda t: (0.05, 0.0002)),
+    ("slow backend", lambda i, t: 50, lambda t: (0.05, 0.0002) if t < 30 else (0.5, 0.002)),
+]
+
+
+def simulate(profile, batching, duration: float) -> dict:
+    name, rate_of, backend_of = profile
+    backend = Backend(0.05, 0.0002, capacity=20000, max_rows=5000)
+
+    readers = [{'buffer': [], 'last_flush': 0.0, 'rate': 0.0, 'read': 0, 'carry': 0.0} for _ in range(STREAMS)]
+    queue = deque()  # Arrival times of committed, not yet uploaded lines
+    latencies = []
+    requests = 0
+    commits = 0
+    inflight = None  # (done at, rows, status)
+    sender_ready = 0.0
+
+    steps = int(duration / STEP)
+    for step in range(steps):
+        now = step * STEP
+        backend.base_latency, backend.row_cost = backend_of(now)
+
+        for i, reader in enumerate(readers):
+            reader['carry'] += rate_of(i, now) * STEP
+            lines, reader['carry'] = int(reader['carry']), reader['carry'] % 1
+            for _ in range(lines):
+                # Readers check whether to flush when a line arrives, as in LogCollector._stream_logs
+                reader['buffer'].append(now)
+                reader['read'] += 1
+                if len(reader['buffer']) >= batching.flush_rows(reader['rate']) or now - reader['last_flush'] > batching.flush_interval:
+                    queue.extend(reader['buffer'])
+                    commits += 1
+                    elapsed = max(now - reader['last_flush'], 1e-3)
+                    reader['rate'] = RATE_SMOOTHING * reader['read'] / elapsed + (1 - RATE_SMOOTHING) * reader['rate']
+                    reader['read'] = 0
+                    reader['buffer'] = []
+                    reader['last_flush'] = now
+
+        if inflight and now >= inflight[0]:
+            _, rows, status = inflight
+            if status == 200:
+                for _ in range(rows):
+                    latencies.append(now - queue.popleft())
+            inflight = None
+
+        if inflight is None and now >= sender_ready:
+            if not queue:
+                batching.on_idle()
+                sender_ready = now + batching.flush_interval
+                continue
+            rows = min(batching.batch_size, len(queue))
+            latency, status = backend.upload(now, rows)
+            requests += 1
+            batching.on_upload(latency, status, rows >= batching.batch_size)
+            inflight = (now + latency, rows, status)
+            sender_ready = now + latency + (0 if status == 200 else batching.backoff)
+
+    latencies.sort()
+    delivered = len(latencies)
+    return {
+        'profile': name,
+        'delivered': delivered,
+        'throughput': delivered / duration,
+        'p50': latencies[delivered // 2] if delivered else float('nan'),
+        'p99': latencies[int(delivered * 0.99)] if delivered else float('nan'),
+        'requests': requests,
+        'commits': commits,
+        'backlog': len(queue) + sum(len(r['buffer']) for r in readers),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=120, help="Simulated seconds per run (default: 120)")
+    args = parser.parse_args()
+
+    print(f"{'profile':<14}{'policy':<10}{'lines/s':>10}{'p50 s':>9}{'p99 s':>9}{'requests':>10}{'commits':>10}{'backlog':>10}")
+    for profile in PROFILES:
+        for policy, batching in (("fixed", FixedBatching()), ("adaptive", AdaptiveBatching(20, 2000, 0.1, 5, 1.0, 60))):
+            r = simulate(profile, batching, args.duration)
+            print(f"{r['profile']:<14}{policy:<10}{r['throughput']:>10.1f}{r['p50']:>9.2f}{r['p99']:>9.2f}"
+                  f"{r['requests']:>10}{r['commits']:>10}{r['backlog']:>10}")
+
+
+if __name__ == "__main__":
+    main()
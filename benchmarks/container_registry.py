@@ -0,0 +1,159 @@
+"""
+Memory and per-cycle cost of container discovery with docker-py objects and with the container registry.
+
+Uses synthetic container summaries and inspect results, so no Docker daemon is needed. Memory is what the
+discovered containers retain between cycles, measured with tracemalloc:
+- docker-py: `Container` objects as returned by `client.containers.list()`, one inspect blob each
+- registry: `ContainerRecord`s kept by a `ContainerRegistry`
+
+Cycle time is the CPU time of one steady-state discovery cycle in which `--churn` of the containers are replaced:
+- full: every container is re-evaluated by `get_monitored` each cycle
+- diff: the registry diff is applied and only the added containers are evaluated
+
+    python benchmarks/container_registry.py [--sizes 1000 5000] [--cycles 20] [--churn 0.01]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from docker.models.containers import Container  # noqa: E402
+
+from src.docker_api import get_monitored, record_from_summary  # noqa: E402
+from src.model.model import Context  # noqa: E402
+from src.services.container_registry import ContainerRegistry  # noqa: E402
+
+EXECUTOR = (Context.host, None)
+
+
+def make_summary(index: int) -> dict:
+    labels = {
+        "com.docker.compose.project": f"project-{index % 50}",
+        "com.docker.compose.service": f"service-{index}",
+        "com.docker.compose.config-hash": f"{index:064x}",
+        "com.docker.compose.version": "2.24.0",
+        "org.opencontainers.image.source": "https://example.com/repo",
+        "maintainer": "team@example.com",
+    }
+    return {
+        "Id": f"{index:064x}",
+        "Names": [f"/project-{index % 50}-service-{index}-1"],
+        "Image": f"registry.example.com/service-{index % 200}:1.0.{index % 10}",
+        "ImageID": f"sha256:{index % 200:064x}",
+        "Command": "/docker-entrypoint.sh serve",
+        "Created": 1700000000 + index,
+        "State": "running",
+        "Status": "Up 2 hours",
+        "Ports": [{"PrivatePort": 8080, "Type": "tcp"}],
+        "Labels": labels,
+        "NetworkSettings": {"Networks": {"bridge": {"IPAddress": f"172.17.{index // 250}.{index % 250}"}}},
+        "Mounts": [],
+    }
+
+
+def make_inspect(summary: dict) -> dict:
+    """
+    Approximation of `/containers/{id}/json`, which docker-py's `containers.list()` fetches for every container.
+    """
+    return {
+        "Id": summary["Id"],
+        "Created": "2024-01-01T00:00:00.000000000Z",
+        "Path": "/docker-entrypoint.sh",
+        "Args": ["serve"],
+        "State": {"Status": summary["State"], "Running": True, "Pid": 4242, "ExitCode": 0,
+                  "StartedAt": "2024-01-01T00:00:01.000000000Z", "FinishedAt": "0001-01-01T00:00:00Z"},
+        "Image": summary["ImageID"],
+        "Name": summary["Names"][0],
+        "RestartCount": 0,
+        "Driver": "overlay2",
+        "LogPath": f"/var/lib/docker/containers/{summary['Id']}/{summary['Id']}-json.log",
+        "HostConfig": {"NetworkMode": "bridge", "RestartPolicy": {"Name": "unless-stopped"},
+                       "LogConfig": {"Type": "json-file", "Config": {"max-size": "10m"}}, "Memory": 0},
+        "GraphDriver": {"Name": "overlay2", "Data": {k: f"/var/lib/docker/overlay2/{summary['Id']}/{k}"
+                                                      for k in ("LowerDir", "MergedDir", "UpperDir", "WorkDir")}},
+        "Mounts": [],
+        "Config": {"Hostname": summary["Id"][:12], "Env": [f"VAR_{i}=value-{i}" for i in range(20)],
+                   "Cmd": ["serve"], "Image": summary["Image"], "Labels": dict(summary["Labels"]),
+                   "ExposedPorts": {"8080/tcp": {}}, "WorkingDir": "/app"},
+        "NetworkSettings": {"Networks": {"bridge": {"IPAddress": "172.17.0.2", "Gateway": "172.17.0.1",
+                                                    "MacAddress": "02:42:ac:11:00:02"}}},
+    }
+
+
+def retained(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def cycle_times(size: int, cycles: int, churn: float) -> tuple[float, float]:
+    summaries = [make_summary(i) for i in range(size)]
+    registry = ContainerRegistry()
+    registry.update(summaries)
+    replaced = max(1, int(size * churn))
+
+    full = diff = 0.0
+    next_index = size
+    for _ in range(cycles):
+        summaries = summaries[replaced:] + [make_summary(next_index + i) for i in range(replaced)]
+        next_index += replaced
+
+        started = time.process_time()
+        get_monitored([record_from_summary(s) for s in summaries], tag_filter=[], executor=EXECUTOR)
+        full += time.process_time() - started
+
+        started = time.process_time()
+        changes = registry.update(summaries)
+        get_monitored(changes.added, tag_filter=[], executor=EXECUTOR)
+        diff += time.process_time() - started
+    return full / cycles, diff / cycles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000], help="Container counts (default: 1000 5000)")
+    parser.add_argument("--cycles", type=int, default=20, help="Discovery cycles per measurement (default: 20)")
+    parser.add_argument("--churn", type=float, default=0.01, help="Share of containers replaced per cycle (default: 0.01)")
+    args = parser.parse_args()
+
+    print(f"{'containers':>10}{'docker-py MiB':>15}{'registry MiB':>14}{'full ms':>10}{'diff ms':>10}")
+    for size in args.sizes:
+        summaries = [make_summary(i) for i in range(size)]
+        inspects = [make_inspect(s) for s in summaries]
+
+        # Both copy what they keep from the API responses, which are dropped after the cycle
+        objects = retained(lambda: [Container(attrs=_deepcopy(i)) for i in inspects])
+
+        def build_registry():
+            registry = ContainerRegistry()
+            registry.update([_deepcopy(s) for s in summaries])
+            return registry
+        records = retained(build_registry)
+
+        full, diff = cycle_times(size, args.cycles, args.churn)
+        print(f"{size:>10}{objects / 2**20:>15.2f}{records / 2**20:>14.2f}{full * 1000:>10.2f}{diff * 1000:>10.2f}")
+
+
+def _deepcopy(value):
+    # Fresh objects, like a decoded API response, so nothing is shared with the synthetic input
+    if isinstance(value, dict):
+        return {k: _deepcopy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_deepcopy(v) for v in value]
+    if isinstance(value, str):
+        return "".join(value)
+    return value
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Soak test of the SQLite spool: file size and delete (ack) latency under sustained traffic, in compressed time.
+
+Readers commit every simulated second, the sender drains the spool in fair batches and acknowledges them by
+id watermark, runs `maintain` as the collector does (every 60s while busy, every 10s while idle) and prunes
+rows past the retention hourly. During an outage in the middle of the run nothing is acknowledged, so a backlog
+builds up; afterwards the sender drains it at `--drain-batches` batches per second. Without incremental vacuum
+and WAL truncation, the file would keep the size of the largest backlog.
+
+    python benchmarks/spool_soak.py [--duration 7200] [--rate 500] [--containers 20]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from src.services.scheduling import DeficitRoundRobin  # noqa: E402
+from src.services.spool import LogSpool  # noqa: E402
+
+BATCH = 1000
+QUANTUM = 20
+MESSAGE = "GET /api/items?page={} 200 in {}ms user-agent=Mozilla/5.0 (X11; Linux x86_64)"
+
+
+def file_size(path: str) -> int:
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def percentile(values: list[float], share: float) -> float:
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=int, default=7200, help="Simulated seconds (default: 7200)")
+    parser.add_argument("--rate", type=int, default=500, help="Lines per simulated second (default: 500)")
+    parser.add_argument("--containers", type=int, default=20, help="Containers writing lines (default: 20)")
+    parser.add_argument("--outage", type=float, nargs=2, default=[0.3, 0.45],
+                        help="Start and end of the backend outage as shares of the run (default: 0.3 0.45)")
+    parser.add_argument("--drain-batches", type=int, default=4, help="Batches uploaded per second while a backlog is drained (default: 4)")
+    parser.add_argument("--retention", type=int, default=24 * 3600, help="Retention in simulated seconds (default: 86400)")
+    parser.add_argument("--report", type=int, default=600, help="Simulated seconds per report line (default: 600)")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    containers = [f"{index:064x}" for index in range(args.containers)]
+    outage = (args.duration * args.outage[0], args.duration * args.outage[1])
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "logs.db")
+        spool = LogSpool(db_path)
+        scheduler = DeficitRoundRobin(QUANTUM)
+        pending = 0
+        ack_latencies = []
+        last_maintenance = 0
+        started = time.perf_counter()
+
+        print(f"{'time':>7}{'pending':>10}{'db MiB':>9}{'wal MiB':>9}{'ack p50 ms':>12}{'ack p99 ms':>12}{'ack max ms':>12}")
+        for second in range(args.duration):
+            now_ns = (1700000000 + second) * 10**9
+            for container_id in containers:
+                lines = args.rate // args.containers
+                spool.insert([
+                    (container_id, now_ns + i, "INFO", MESSAGE.format(rng.randrange(1000), rng.randrange(500)), None)
+                    for i in range(lines)
+                ])
+                pending += lines
+
+            busy = False
+            if not outage[0] <= second < outage[1]:
+                for _ in range(args.drain_batches):
+                    rows = scheduler.select(
+                        spool.next_container,
+                        lambda container_id, limit, last: spool.fetch(container_id, limit, last[0] if last else 0),
+                        BATCH
+                    )
+                    if not rows:
+                        break
+                    busy = True
+                    watermarks = {}
+                    for row in rows:
+                        watermarks[row[1]] = row[0]
+                    ack_started = time.perf_counter()
+                    spool.ack(watermarks)
+                    ack_latencies.append(time.perf_counter() - ack_started)
+                    pending -= len(rows)
+                    if len(rows) < BATCH:
+                        break
+
+            if second - last_maintenance > (60 if busy else 10):
+                spool.maintain(idle=pending == 0)
+                last_maintenance = second
+            if second % 3600 == 0:
+                pending -= spool.prune(now_ns - args.retention * 10**9)
+
+            if (second + 1) % args.report == 0:
+                print(f"{second + 1:>6}s{pending:>10}{file_size(db_path) / 2**20:>9.2f}{file_size(db_path + '-wal') / 2**20:>9.2f}"
+                      f"{percentile(ack_latencies, 0.5) * 1000:>12.2f}{percentile(ack_latencies, 0.99) * 1000:>12.2f}"
+                      f"{max(ack_latencies, default=float('nan')) * 1000:>12.2f}")
+                ack_latencies = []
+        spool.close()
+        print(f"Simulated {args.duration}s in {time.perf_counter() - started:.0f}s, outage from {outage[0]:.0f}s to {outage[1]:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Encode time and payload size of the columnar wire format against the JSON upload body.
+
+Batches are built from synthetic rows as the sender fetches them from the spool. The JSON path builds the
+pydantic transfer models and serializes them, as `APIClient.upload_agent_logs` does; the columnar path runs
+`wire.encode_batch`, as `APIClient.upload_columnar_logs` does. Every columnar batch is decoded again and compared
+with the JSON transfer. Gzip sizes are shown for reference only, uploads are not compressed.
+
+    python benchmarks/wire_format.py [--containers 5 20] [--rows 100] [--repeat 50]
+"""
+import argparse
+import gzip
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from src import wire  # noqa: E402
+from src.model.api import Log, MultiContainerLogTransfer, MultilineLogTransfer  # noqa: E402
+
+AGENT_ID = "agent-0000"
+PATHS = ["/", "/api/items", "/api/items/42", "/login", "/static/app.js", "/health"]
+
+
+def access_row(rng: random.Random, timestamp: int) -> wire.Row:
+    status = rng.choice([200, 200, 200, 304, 404, 500])
+    message = (f'10.0.{rng.randrange(256)}.{rng.randrange(256)} - - [01/Jan/2024:00:00:00 +0000] '
+               f'"GET {rng.choice(PATHS)} HTTP/1.1" {status} {rng.randrange(100000)} "-" "Mozilla/5.0 (X11; Linux x86_64)"')
+    return timestamp, "ERROR" if status >= 500 else "WARNING" if status >= 400 else "INFO", message, None
+
+
+def json_row(rng: random.Random, timestamp: int) -> wire.Row:
+    attributes = {"path": rng.choice(PATHS), "status": str(rng.choice([200, 201, 404])),
+                  "duration_ms": str(rng.randrange(500)), "request_id": f"{rng.getrandbits(64):016x}"}
+    return timestamp, rng.choice(["INFO", "INFO", "DEBUG", "WARNING"]), '{"msg": "request handled"}', attributes
+
+
+PROFILES = {"access": access_row, "json": json_row}
+
+
+def make_batch(profile, containers: int, rows: int, seed: int = 1) -> list[tuple[str, list[wire.Row]]]:
+    rng = random.Random(seed)
+    batch = []
+    for index in range(containers):
+        timestamp = 1700000000 * 10**9 + index
+        container_rows = []
+        for _ in range(rows):
+            timestamp += rng.randrange(10**6, 10**8)
+            container_rows.append(profile(rng, timestamp))
+        batch.append((f"{index:064x}", container_rows))
+    return batch
+
+
+def encode_json(batch) -> bytes:
+    return MultiContainerLogTransfer(
+        agent_id=AGENT_ID,
+        container_logs=[
+            MultilineLogTransfer(
+                container_id=container_id,
+                logs=[Log(container_id=container_id, timestamp=ts, level=level, message=message, attributes=attributes)
+                      for ts, level, message, attributes in rows]
+            )
+            for container_id, rows in batch
+        ]
+    ).model_dump_json().encode()
+
+
+def encode_columnar(batch) -> bytes:
+    return b"".join(wire.encode_batch(AGENT_ID, batch))
+
+
+def timed(encode, batch, repeat: int) -> tuple[bytes, float]:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        payload = encode(batch)
+    return payload, (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--containers", type=int, nargs="+", default=[5, 20], help="Containers per batch (default: 5 20)")
+    parser.add_argument("--rows", type=int, default=100, help="Rows per container (default: 100)")
+    parser.add_argument("--repeat", type=int, default=50, help="Encodings per measurement (default: 50)")
+    args = parser.parse_args()
+
+    print(f"{'profile':<8}{'rows':>6}{'format':>10}{'encode ms':>11}{'bytes':>10}{'gzip bytes':>12}{'size':>7}")
+    for name, profile in PROFILES.items():
+        for containers in args.containers:
+            batch = make_batch(profile, containers, args.rows)
+            json_payload, json_time = timed(encode_json, batch, args.repeat)
+            columnar_payload, columnar_time = timed(encode_columnar, batch, args.repeat)
+            if wire.decode_batch(columnar_payload).model_dump_json().encode() != json_payload:
+                raise SystemExit(f"Columnar batch of profile {name} does not decode to the JSON transfer")
+
+            for label, payload, seconds in (("json", json_payload, json_time), ("columnar", columnar_payload, columnar_time)):
+                print(f"{name:<8}{containers * args.rows:>6}{label:>10}{seconds * 1000:>11.2f}{len(payload):>10}"
+                      f"{len(gzip.compress(payload)):>12}{len(payload) / len(json_payload):>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
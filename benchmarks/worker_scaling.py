@@ -0,0 +1,111 @@
+"""
+Ingest throughput with stream readers in threads of one process and sharded across worker processes.
+
+Runs the ingest hot path of the collector (the container pipeline, then commits to the shared SQLite spool)
+on synthetic JSON log lines, so no Docker daemon is needed. Containers are sharded across the workers as
+by `WorkerPool`, each container is read by its own thread, like a stream reader.
+
+    python benchmarks/worker_scaling.py [--workers 1 2 4] [--containers 16] [--lines 20000]
+
+Throughput can only scale up to the number of cores, which is printed with the results.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from src.model.model import ContainerRecord  # noqa: E402
+from src.services.aggregation import LogAggregator  # noqa: E402
+from src.services.pipeline import ContainerPipeline  # noqa: E402
+from src.services.spool import LogSpool  # noqa: E402
+
+BATCH = 500  # Rows per commit
+
+
+def make_lines(count: int) -> list[tuple[str, str]]:
+    return [
+        (f"2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}.{i:09d}Z",
+         f'{{"level": "{("info", "warn", "error")[i % 3]}", "msg": "request handled", "path": "/api/items/{i}", '
+         f'"status": {200 + i % 5}, "duration_ms": {i % 97}, "ts": "2024-01-01T00:00:00Z"}}')
+        for i in range(count)
+    ]
+
+
+def read_container(spool: LogSpool, index: int, lines: list[tuple[str, str]]):
+    container = ContainerRecord(f"{index:064x}", f"container-{index}", "image", "running", 0, {})
+    pipeline = ContainerPipeline(container, LogAggregator())
+    stop_event = threading.Event()
+    buffer = []
+    for timestamp, content in lines:
+        row = pipeline.process(timestamp, content, stop_event)
+        if row:
+            buffer.append(row)
+        if len(buffer) >= BATCH:
+            spool.insert(buffer)
+            buffer = []
+    if buffer:
+        spool.insert(buffer)
+    spool.close()
+
+
+def ingest(db_path: str, containers: list[int], lines_per_container: int):
+    """
+    One worker: a reader thread per container, all writing to the shared spool.
+    """
+    spool = LogSpool(db_path)
+    lines = make_lines(lines_per_container)
+    threads = [threading.Thread(target=read_container, args=(spool, index, lines)) for index in containers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run(workers: int, containers: int, lines: int) -> float:
+    """
+    :param workers: Worker processes, 0 for reader threads in this process
+    :return: Lines per second
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "logs.db")
+        LogSpool(db_path)
+        started = time.perf_counter()
+        if workers == 0:
+            ingest(db_path, list(range(containers)), lines)
+        else:
+            context = multiprocessing.get_context("spawn")
+            processes = [
+                context.Process(target=ingest, args=(db_path, list(range(index, containers, workers)), lines))
+                for index in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        # Process start-up is part of the cost, as the pool spawns its workers the same way
+        return containers * lines / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker process counts (default: 1 2 4)")
+    parser.add_argument("--containers", type=int, default=16, help="Containers, sharded across the workers (default: 16)")
+    parser.add_argument("--lines", type=int, default=20000, help="Lines per container (default: 20000)")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores, {args.containers} containers, {args.lines} lines each")
+    print(f"{'mode':<12}{'lines/s':>12}{'speedup':>10}")
+    baseline = run(0, args.containers, args.lines)
+    print(f"{'threads':<12}{baseline:>12.0f}{1:>10.2f}")
+    for workers in args.workers:
+        throughput = run(workers, args.containers, args.lines)
+        print(f"{f'{workers} workers':<12}{throughput:>12.0f}{throughput / baseline:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import argparse
 import time
 import logging
 import socket
@@ -8,18 +9,23 @@ from src.model.api import Agent
 from src.api import APIClient
 from src.services.log_collector import LogCollector
 from src.services.agent_services import DiscoveryService, HeartbeatService
-from src.docker_api import get_executor
+from src.services.metrics import MetricsServer
+from src.services.watchdog import watchdog
+from src.docker_api import get_endpoints, get_executor
 from src.model.model import Context as DiscoveryContext
 
 # Configure logging
 logging.basicConfig(level=Config.LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def main():
+def run():
     logger.info("Starting Clogs Agent...")
 
-    # Determine on_host
-    executor = get_executor()
+    endpoints = get_endpoints()
+    logger.info(f"Monitoring Docker endpoints: {', '.join(endpoints)}")
+
+    # Determine on_host (relative to the first endpoint)
+    executor = get_executor(endpoints[0])
     on_host = executor[0] == DiscoveryContext.host
 
     api_client = APIClient()
@@ -64,19 +70,26 @@ def main():
 
     # Initialize Services
     log_collector = LogCollector(api_client, agent.id)
-    discovery_service = DiscoveryService(api_client, log_collector, agent.id)
+    discovery_service = DiscoveryService(api_client, log_collector, agent.id, endpoints)
     heartbeat_service = HeartbeatService(api_client, agent.id)
+    metrics_server = MetricsServer(Config.METRICS_PORT) if Config.METRICS_PORT else None
 
     # Start Services
+    if metrics_server:
+        metrics_server.start()
     log_collector.start()
     discovery_service.start()
     heartbeat_service.start()
+    watchdog.start()
 
     def signal_handler(sig, frame):
         logger.info("Received termination signal. Stopping Clogs Agent...")
+        watchdog.stop()
         heartbeat_service.stop()
         discovery_service.stop()
         log_collector.stop()
+        if metrics_server:
+            metrics_server.stop()
         sys.exit(0)
 
     signal.signal(signal.SIGTERM, signal_handler)
@@ -88,14 +101,73 @@ def main():
     except KeyboardInterrupt:
         # Handled by signal_handler or here if signal not caught
         logger.info("Stopping Clogs Agent...")
+        watchdog.stop()
         heartbeat_service.stop()
         discovery_service.stop()
         log_collector.stop()
+        if metrics_server:
+            metrics_server.stop()
     except Exception as e:
         logger.error(f"Unexpected error: {e}", exc_info=True)
+        watchdog.stop()
         heartbeat_service.stop()
         discovery_service.stop()
         log_collector.stop()
+        if metrics_server:
+            metrics_server.stop()
+
+def backfill(args: argparse.Namespace) -> int:
+    from src.services.backfill import Backfill, parse_duration, parse_time, resolve_containers
+
+    try:
+        until = parse_time(args.until) if args.until else time.time()
+        since = parse_time(args.since)
+        chunk_seconds = parse_duration(args.chunk)
+        if since >= until:
+            raise ValueError("--since has to be before --until")
+        containers = resolve_containers(args.container or [], args.endpoint)
+    except ValueError as e:
+        logger.error(str(e))
+        return 2
+    except Exception as e:
+        logger.error(f"Failed to list containers on {args.endpoint}: {e}")
+        return 2
+    if not containers:
+        logger.error("No containers to backfill")
+        return 2
+    if Config.load_id() is None:
+        logger.warning("This agent is not registered yet, backfilled logs are uploaded once it runs")
+
+    job = Backfill(containers, since, until, chunk_seconds, args.concurrency, args.rate)
+    signal.signal(signal.SIGTERM, lambda sig, frame: job.stop())
+    signal.signal(signal.SIGINT, lambda sig, frame: job.stop())
+    job.run()
+    return 1 if job.stop_event.is_set() else 0
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="main.py", description="Clogs Agent")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("run", help="Run the agent (default)")
+    backfill_parser = commands.add_parser(
+        "backfill",
+        help="Queue historical logs for upload by the running agent",
+        description="Fetches logs of a time range in parallel chunks and queues them behind live logs. "
+                    "Times are durations ago (90m, 6h, 2d), ISO 8601 timestamps (UTC unless an offset is given) or epoch seconds."
+    )
+    backfill_parser.add_argument("--container", action="append", help="Container name or id, repeatable. Defaults to all monitored containers")
+    backfill_parser.add_argument("--since", required=True, help="Start of the time range")
+    backfill_parser.add_argument("--until", help="End of the time range (default: now)")
+    backfill_parser.add_argument("--endpoint", default=get_endpoints()[0], help="Docker endpoint of the containers (default: the first configured endpoint)")
+    backfill_parser.add_argument("--chunk", default=Config.BACKFILL_CHUNK, help=f"Length of the chunks fetched in parallel (default: {Config.BACKFILL_CHUNK})")
+    backfill_parser.add_argument("--concurrency", type=int, default=Config.BACKFILL_CONCURRENCY, help=f"Chunks fetched at the same time (default: {Config.BACKFILL_CONCURRENCY})")
+    backfill_parser.add_argument("--rate", type=float, default=Config.BACKFILL_RATE, help=f"Maximum lines per second over all chunks (default: {Config.BACKFILL_RATE:g})")
+    args = parser.parse_args(argv)
+
+    if args.command == "backfill":
+        if args.concurrency < 1 or args.rate <= 0:
+            parser.error("--concurrency and --rate have to be positive")
+        sys.exit(backfill(args))
+    run()
 
 if __name__ == "__main__":
     main()
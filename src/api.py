@@ -1,7 +1,9 @@
-from typing import Optional
+import time
+from typing import Iterable, Optional, Sequence
 
 import requests
 import logging
+from src import wire
 from src.config import Config
 from src.model.api import *
 
@@ -14,6 +16,15 @@ class APIClient:
         if Config.API_KEY:
             self.session.headers.update({"X-API-Key": Config.API_KEY})
 
+        # Columnar log uploads: None = not negotiated yet, False = unsupported since `columnar_checked_at`
+        self.columnar_supported: bool | None = None if Config.WIRE_FORMAT == "auto" else Config.WIRE_FORMAT == "columnar"
+        self.columnar_checked_at = 0.0
+        # Batched status uploads: None = not negotiated yet, False = unsupported since `status_batches_checked_at`
+        self.status_batches_supported: bool | None = None
+        self.status_batches_checked_at = 0.0
+        # HTTP status of the last log upload, None if it got no response
+        self.last_upload_status: int | None = None
+
     def register_agent(self, agent: Agent) -> str | None:
         try:
             response = self.session.post(
@@ -80,6 +91,38 @@ class APIClient:
             logger.error(f"Failed to update container status: {e}")
             return False
 
+    def update_container_statuses(self, agent_id: str, statuses: ContainerStatusTransfer) -> bool | None:
+        """
+        Upload status transitions of several containers in one request.
+        A backend without support is probed again after an hour, in case it was upgraded.
+        :param agent_id: ID of the agent
+        :param statuses: Transitions to upload, oldest first
+        :return: True if upload was successful, False otherwise, None if the backend does not support batches
+        """
+        if not statuses.changes:
+            return True
+        if self.status_batches_supported is False:
+            if time.time() - self.status_batches_checked_at < 3600:
+                return None
+            self.status_batches_supported = None
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/agent/{agent_id}/container/status",
+                data=statuses.model_dump_json(),
+                headers={"Content-Type": "application/json"}
+            )
+            if response.status_code in (404, 405):
+                logger.info("Backend does not support batched status updates, updating containers one by one")
+                self.status_batches_supported = False
+                self.status_batches_checked_at = time.time()
+                return None
+            response.raise_for_status()
+            self.status_batches_supported = True
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to update container statuses: {e}")
+            return False
+
     def update_container_state(self, agent_id: str, container_id: str, state: Container) -> bool:
         try:
             response = self.session.put(
@@ -155,17 +198,77 @@ class APIClient:
         if not logs.container_logs:
             return True
         try:
+            self.last_upload_status = None
             response = self.session.post(
                 f"{self.base_url}/api/agent/{agent_id}/logs",
                 data=logs.model_dump_json(),
                 headers={"Content-Type": "application/json"}
             )
+            self.last_upload_status = response.status_code
             response.raise_for_status()
             return True
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to send logs: {e}")
             return False
 
+    def use_columnar(self) -> bool:
+        """
+        Whether log batches should be sent in the columnar format.
+        In "auto" mode an unsupported backend is probed again after an hour, in case it was upgraded.
+        """
+        if self.columnar_supported is False and Config.WIRE_FORMAT == "auto" and time.time() - self.columnar_checked_at > 3600:
+            self.columnar_supported = None
+        return self.columnar_supported is not False
+
+    def upload_columnar_logs(self, agent_id: str, blocks: Iterable[tuple[str, Sequence[wire.Row]]]) -> bool | None:
+        """
+        Upload logs for the agent in the compact columnar format (see src/wire.py).
+        The body is streamed with chunked transfer encoding.
+        :param agent_id: ID of the agent
+        :param blocks: (container_id, [(timestamp, level, message, attributes), ...]) pairs
+        :return: True if upload was successful, False otherwise, None if the backend does not support the format
+        """
+        try:
+            self.last_upload_status = None
+            response = self.session.post(
+                f"{self.base_url}/api/agent/{agent_id}/logs/columnar",
+                data=wire.encode_batch(agent_id, blocks),
+                headers={"Content-Type": wire.CONTENT_TYPE}
+            )
+            self.last_upload_status = response.status_code
+            if response.status_code in (404, 405, 415) and Config.WIRE_FORMAT == "auto":
+                logger.info("Backend does not support columnar log uploads, falling back to JSON")
+                self.columnar_supported = False
+                self.columnar_checked_at = time.time()
+                return None
+            response.raise_for_status()
+            self.columnar_supported = True
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to send columnar logs: {e}")
+            return False
+
+    def upload_log_summaries(self, agent_id: str, summaries: LogSummaryTransfer) -> bool:
+        """
+        Upload pre-aggregated log level counts and top message fingerprints.
+        :param agent_id: ID of the agent
+        :param summaries: Summaries to upload
+        :return: True if upload was successful, False otherwise
+        """
+        if not summaries.summaries:
+            return True
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/agent/{agent_id}/logs/summary",
+                data=summaries.model_dump_json(),
+                headers={"Content-Type": "application/json"}
+            )
+            response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to send log summaries: {e}")
+            return False
+
     def upload_container_logs(self, agent_id: str, container_logs: MultilineLogTransfer | Log) -> bool:
         """
         Upload logs for a specific container.
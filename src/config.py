@@ -8,6 +8,51 @@ class Config:
     LOG_LEVEL = os.getenv("CLOGS_AGENT_LOG_LEVEL", os.getenv("CLOGS_LOG_LEVEL", "INFO"))
     API_KEY = os.getenv("CLOGS_AGENT_API_KEY", "")
     MONITORING_TAG = os.getenv("CLOGS_AGENTS_MONITORING_TAG", "clogs.monitoring.enabled=true")
+    WORKER_PROCESSES = int(os.getenv("CLOGS_AGENT_WORKER_PROCESSES", "0"))
+    WORKER_SHARDING = os.getenv("CLOGS_AGENT_WORKER_SHARDING", "balanced")
+    FAIR_QUANTUM = int(os.getenv("CLOGS_AGENT_FAIR_QUANTUM", "20"))
+    RATE_LIMIT = float(os.getenv("CLOGS_AGENT_RATE_LIMIT", "0"))
+    RATE_LIMIT_BURST = float(os.getenv("CLOGS_AGENT_RATE_LIMIT_BURST", "0"))
+    RATE_LIMIT_MODE = os.getenv("CLOGS_AGENT_RATE_LIMIT_MODE", "delay")
+    WIRE_FORMAT = os.getenv("CLOGS_AGENT_WIRE_FORMAT", "auto")
+    STRUCTURED_PARSING = os.getenv("CLOGS_AGENT_STRUCTURED_PARSING", "true").lower() == "true"
+    SUMMARIES = os.getenv("CLOGS_AGENT_SUMMARIES", "false").lower() == "true"
+    SUMMARY_BUCKET_SECONDS = int(os.getenv("CLOGS_AGENT_SUMMARY_BUCKET_SECONDS", "60"))
+    SUMMARY_TOP_K = int(os.getenv("CLOGS_AGENT_SUMMARY_TOP_K", "10"))
+    SUMMARY_BACKLOG = int(os.getenv("CLOGS_AGENT_SUMMARY_BACKLOG", "10000"))
+    COLLECTION_MODE = os.getenv("CLOGS_AGENT_COLLECTION_MODE", "api")
+    DOCKER_CONTAINERS_DIR = os.getenv("CLOGS_AGENT_DOCKER_CONTAINERS_DIR", "/var/lib/docker/containers")
+    MEMORY_BUFFER_SIZE = int(os.getenv("CLOGS_AGENT_MEMORY_BUFFER_SIZE", "10000"))
+    ALWAYS_PERSIST = os.getenv("CLOGS_AGENT_ALWAYS_PERSIST", "false").lower() == "true"
+    FILTER_INCLUDE = os.getenv("CLOGS_AGENT_FILTER_INCLUDE", "")
+    FILTER_EXCLUDE = os.getenv("CLOGS_AGENT_FILTER_EXCLUDE", "")
+    REDACT = os.getenv("CLOGS_AGENT_REDACT", "")
+    METRICS_PORT = int(os.getenv("CLOGS_AGENT_METRICS_PORT", "0"))
+    BACKFILL_CHUNK = os.getenv("CLOGS_AGENT_BACKFILL_CHUNK", "15m")
+    BACKFILL_CONCURRENCY = int(os.getenv("CLOGS_AGENT_BACKFILL_CONCURRENCY", "4"))
+    BACKFILL_RATE = float(os.getenv("CLOGS_AGENT_BACKFILL_RATE", "2000"))
+    DOCKER_CONTROL_POOL_SIZE = int(os.getenv("CLOGS_AGENT_DOCKER_CONTROL_POOL_SIZE", "4"))
+    DOCKER_CONTROL_TIMEOUT = float(os.getenv("CLOGS_AGENT_DOCKER_CONTROL_TIMEOUT", "30"))
+    DOCKER_STREAM_POOL_SIZE = int(os.getenv("CLOGS_AGENT_DOCKER_STREAM_POOL_SIZE", "128"))
+    DOCKER_STREAM_TIMEOUT = float(os.getenv("CLOGS_AGENT_DOCKER_STREAM_TIMEOUT", "60"))
+    GOVERNOR = os.getenv("CLOGS_AGENT_GOVERNOR", "true").lower() == "true"
+    CPU_BUDGET = float(os.getenv("CLOGS_AGENT_CPU_BUDGET", "0"))
+    MEMORY_BUDGET = float(os.getenv("CLOGS_AGENT_MEMORY_BUDGET", "0"))
+    GOVERNOR_INTERVAL = float(os.getenv("CLOGS_AGENT_GOVERNOR_INTERVAL", "2"))
+    GOVERNOR_SAMPLE_RATE = int(os.getenv("CLOGS_AGENT_GOVERNOR_SAMPLE_RATE", "10"))
+    STATUS_EVENTS = os.getenv("CLOGS_AGENT_STATUS_EVENTS", "true").lower() == "true"
+    STATUS_FLUSH_INTERVAL = float(os.getenv("CLOGS_AGENT_STATUS_FLUSH_INTERVAL", "1"))
+    STATUS_BACKLOG = int(os.getenv("CLOGS_AGENT_STATUS_BACKLOG", "10000"))
+    HEALTH_FILE = os.getenv("CLOGS_AGENT_HEALTH_FILE", "/tmp/healthy")
+    WATCHDOG_INTERVAL = float(os.getenv("CLOGS_AGENT_WATCHDOG_INTERVAL", "5"))
+    STALL_TIMEOUT = float(os.getenv("CLOGS_AGENT_STALL_TIMEOUT", "60"))
+    BATCH_MIN = int(os.getenv("CLOGS_AGENT_BATCH_MIN", "20"))
+    BATCH_MAX = int(os.getenv("CLOGS_AGENT_BATCH_MAX", "2000"))
+    FLUSH_INTERVAL_MIN = float(os.getenv("CLOGS_AGENT_FLUSH_INTERVAL_MIN", "0.1"))
+    FLUSH_INTERVAL_MAX = float(os.getenv("CLOGS_AGENT_FLUSH_INTERVAL_MAX", "5"))
+    TARGET_LATENCY = float(os.getenv("CLOGS_AGENT_TARGET_LATENCY", "1"))
+    BACKOFF_MAX = float(os.getenv("CLOGS_AGENT_BACKOFF_MAX", "60"))
+    DOCKER_HOSTS = [host.strip() for host in os.getenv("CLOGS_AGENT_DOCKER_HOSTS", "").split(",") if host.strip()]
 
     @classmethod
     def _ensure_data_dir(cls):
@@ -1,27 +1,151 @@
 import logging
-from functools import lru_cache
+import threading
 from typing import List
 
-from docker import errors
+from docker import DockerClient, errors
 from docker import from_env
 from docker.models.containers import Container
 
 from src.config import Config
-from src.model.model import Context, MONITORING_TYPE
+from src.model.model import Context, ContainerRecord, MONITORING_TYPE
+from src.services.metrics import Metrics, metrics
 
 logger = logging.getLogger(__name__)
 MONITORING_TAG = Config.MONITORING_TAG
 
-client = from_env()
+# Labels kept on ContainerRecords: context resolution, the monitoring tag and the agent's own clogs.* labels
+RETAINED_LABEL_PREFIX = "clogs."
+RETAINED_LABELS = {'com.docker.stack.namespace', 'com.docker.compose.project', MONITORING_TAG.split('=')[0]}
 
-@lru_cache(maxsize=1)
-def get_executor() -> tuple[Context, str | None]:
+# Endpoint configured through the standard DOCKER_HOST/DOCKER_TLS_VERIFY/... environment
+DEFAULT_ENDPOINT = "default"
+
+# Connection purposes, each with its own client and connection pool per endpoint:
+# control calls (list, inspect) must not queue behind the long-lived connections held by log streams.
+CONTROL = "control"
+STREAM = "stream"
+
+_clients: dict[tuple[str, str], DockerClient] = {}
+_clients_lock = threading.Lock()
+
+def get_endpoints() -> list[str]:
+    """
+    :return: Docker endpoints to monitor, see Config.DOCKER_HOSTS
+    """
+    return Config.DOCKER_HOSTS or [DEFAULT_ENDPOINT]
+
+def get_client(endpoint: str = DEFAULT_ENDPOINT, purpose: str = CONTROL) -> DockerClient:
+    """
+    Returns the client of a Docker endpoint, creating it on first use.
+    Clients are created lazily, so an unreachable daemon only affects the callers using its endpoint.
+    :param endpoint: DEFAULT_ENDPOINT or a daemon URL (unix://, tcp:// or ssh://)
+    :param purpose: CONTROL for short API calls, STREAM for log streams, which hold a connection while they run
+    """
+    key = (endpoint, purpose)
+    endpoint_client = _clients.get(key)
+    if endpoint_client is not None:
+        return endpoint_client
+
+    if purpose == STREAM:
+        options = {'max_pool_size': Config.DOCKER_STREAM_POOL_SIZE, 'timeout': Config.DOCKER_STREAM_TIMEOUT}
+    else:
+        options = {'max_pool_size': Config.DOCKER_CONTROL_POOL_SIZE, 'timeout': Config.DOCKER_CONTROL_TIMEOUT}
+
+    # Connecting negotiates the API version with the daemon, so it happens outside the lock
+    if endpoint == DEFAULT_ENDPOINT:
+        endpoint_client = from_env(**options)
+    else:
+        endpoint_client = DockerClient(base_url=endpoint, use_ssh_client=endpoint.startswith('ssh://'), **options)
+    with _clients_lock:
+        existing = _clients.setdefault(key, endpoint_client)
+    if existing is not endpoint_client:
+        endpoint_client.close()
+    return existing
+
+class _DiscardCounter(logging.Handler):
+    """
+    Counts urllib3's "Connection pool is full, discarding connection" warnings, i.e. connections that were
+    closed instead of being returned to a pool because it was already full.
+    """
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.discarded = 0
+
+    def emit(self, record: logging.LogRecord):
+        if record.getMessage().startswith("Connection pool is full"):
+            self.discarded += 1
+
+_discards = _DiscardCounter()
+logging.getLogger('urllib3.connectionpool').addHandler(_discards)
+
+def discarded_connections() -> int:
+    """
+    :return: Connections closed since start because their pool was full (over all clients)
     """
-    Determines the context and name of the current executor container.
+    return _discards.discarded
+
+def connection_stats() -> list[dict]:
+    """
+    Connection reuse of every client: how many connections were opened for how many requests
+    and how many are idle in the pool.
+    :return: One dict per (endpoint, purpose)
+    """
+    stats = []
+    with _clients_lock:
+        clients = list(_clients.items())
+    for (endpoint, purpose), endpoint_client in clients:
+        opened = requests = idle = 0
+        for adapter in endpoint_client.api.adapters.values():
+            # Docker's unix/ssh adapters keep their pools directly, requests' HTTPAdapter in a pool manager
+            pools = getattr(adapter, 'pools', None)
+            if pools is None and getattr(adapter, 'poolmanager', None) is not None:
+                pools = adapter.poolmanager.pools
+            if pools is None:
+                continue
+            with pools.lock:
+                connection_pools = [pools[key] for key in pools.keys()]
+            for pool in connection_pools:
+                opened += pool.num_connections
+                requests += pool.num_requests
+                if pool.pool is not None:
+                    # The queue is pre-filled with None placeholders up to the pool size
+                    idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        stats.append({
+            'endpoint': endpoint,
+            'purpose': purpose,
+            'connections_opened': opened,
+            'requests': requests,
+            'idle': idle,
+            'reuse_ratio': 1 - opened / requests if requests else 0.0,
+        })
+    return stats
+
+def _collect_connection_metrics(registry: Metrics):
+    for stats in connection_stats():
+        labels = {'endpoint': stats['endpoint'], 'purpose': stats['purpose']}
+        registry.set("clogs_docker_connections_opened", stats['connections_opened'], **labels)
+        registry.set("clogs_docker_requests", stats['requests'], **labels)
+        registry.set("clogs_docker_idle_connections", stats['idle'], **labels)
+        registry.set("clogs_docker_connection_reuse_ratio", stats['reuse_ratio'], **labels)
+    registry.set("clogs_docker_connections_discarded", discarded_connections())
+
+metrics.add_collector(_collect_connection_metrics)
+
+_executors: dict[str, tuple[Context, str | None]] = {}
+
+def get_executor(endpoint: str = DEFAULT_ENDPOINT) -> tuple[Context, str | None]:
+    """
+    Determines the context and name of the current executor container on the given endpoint.
     It first tries to get the container ID from the hostname or /proc files,
     then retrieves the container object and its labels to determine the context.
+    On endpoints the agent does not run on, the container is not found and the host context is returned.
+    The result is cached per endpoint, unless the lookup failed (e.g. because the daemon was unreachable).
     :return: A tuple of (Context, container name or None)
     """
+    if endpoint in _executors:
+        return _executors[endpoint]
+
     used_hostname = False
     container_id = None
     try:
@@ -51,19 +175,51 @@ def get_executor() -> tuple[Context, str | None]:
             used_hostname = True
             logger.info(f"Determining container ID failed, using hostname: {container_id}")
 
-        return get_container_context(client.containers.get(container_id))
+        executor = get_container_context(get_client(endpoint).containers.get(container_id))
     except errors.NotFound:
         if not used_hostname:
             logger.warning(f"Container with ID {container_id} not found.")
         if used_hostname:
             logger.info(f"No container found for ID derived from hostname: {container_id}, most likely running outside a container.")
-        return Context.host, None
+        executor = Context.host, None
     except Exception as e:
         import traceback
         traceback.print_exc()
         return Context.orphan, None
 
-def get_container_context(container: Container) -> tuple[Context, str | None]:
+    _executors[endpoint] = executor
+    return executor
+
+def record_from_summary(summary: dict, endpoint: str = DEFAULT_ENDPOINT) -> ContainerRecord:
+    """
+    Builds a compact record from an entry of the container list endpoint (`/containers/json`).
+    :param summary: Container summary as returned by `client.api.containers()`
+    :param endpoint: Docker endpoint the container runs on
+    :return: ContainerRecord with its context resolved
+    """
+    labels = summary.get('Labels') or {}
+    names = summary.get('Names') or []
+    record = ContainerRecord(
+        id=summary['Id'],
+        name=names[0].lstrip('/') if names else summary['Id'][:12],
+        image=summary.get('Image') or "unknown",
+        status=summary.get('State') or "unknown",
+        created=int(summary.get('Created') or 0),
+        labels={k: v for k, v in labels.items() if k.startswith(RETAINED_LABEL_PREFIX) or k in RETAINED_LABELS},
+        endpoint=endpoint,
+    )
+    record.context, record.context_name = get_container_context(record)
+    return record
+
+def list_containers(endpoint: str = DEFAULT_ENDPOINT) -> list[dict]:
+    """
+    Lists all containers of an endpoint with a single list call.
+    Unlike `client.containers.list()`, this does not inspect every container.
+    :return: Container summaries, see `record_from_summary`
+    """
+    return get_client(endpoint).api.containers(all=True)
+
+def get_container_context(container: Container | ContainerRecord) -> tuple[Context, str | None]:
     try:
         executor_container = container
         executor_labels = executor_container.labels
@@ -86,12 +242,17 @@ def get_container_context(container: Container) -> tuple[Context, str | None]:
         traceback.print_exc()
         return Context.orphan, None
 
-def filter_by_tags(all_containers: list[Container], tag_filter: List[str] | None) -> list[Container]:
+def has_monitoring_tag(container: ContainerRecord) -> bool:
+    key, _, value = MONITORING_TAG.partition('=')
+    return bool(container.labels) and container.labels.get(key) == value
+
+def filter_by_tags(all_containers: list[ContainerRecord], tag_filter: List[str] | None) -> list[ContainerRecord]:
     """
     Filters the given list of containers by the given tag filter.
     If no tag filter is given, it checks if any container has the default monitoring tag, and if so, it filters by that tag.
     If a tag filter is given, it filters by the given tags.
     If no tags are given, it returns all containers.
+    Only labels retained on the records (see RETAINED_LABELS) can be filtered on.
 
     :param all_containers: List of all containers to filter.
     :param tag_filter: List of tags to filter by.
@@ -102,7 +263,7 @@ def filter_by_tags(all_containers: list[Container], tag_filter: List[str] | None
 
     if tag_filter is None:
         # Check if any container has the monitoring tag
-        monitoring_tagged_containers = [c for c in all_containers if c.labels and c.labels.get(MONITORING_TAG.split('=')[0]) == MONITORING_TAG.split('=')[1]]
+        monitoring_tagged_containers = [c for c in all_containers if has_monitoring_tag(c)]
         if len(monitoring_tagged_containers) > 0:
             internal_filter.append(MONITORING_TAG)
 
@@ -126,20 +287,21 @@ def filter_by_tags(all_containers: list[Container], tag_filter: List[str] | None
         return filtered_containers
     return all_containers
 
-def get_monitored(containers: List[Container] | None = None, tag_filter: List[str] = None, cross_containerization_bounds: bool = False, executor: tuple[Context, str] | None = None) -> MONITORING_TYPE:
+def get_monitored(containers: List[ContainerRecord] | None = None, tag_filter: List[str] = None, cross_containerization_bounds: bool = False, executor: tuple[Context, str] | None = None, endpoint: str = DEFAULT_ENDPOINT) -> MONITORING_TYPE:
     """
     Gets all monitored containers, grouped by their context (orphan, compose, stack) and name.
     :param executor: Tuple of (Context, container name or None) representing the executor container.
     :param containers: List of containers to check.
+    :param endpoint: Docker endpoint to list containers and resolve the executor on, if not given.
     :param tag_filter: List of tags to filter by. (See `filter_by_tags` for details.)
     :param cross_containerization_bounds: Whether to include containers from other contexts.
     :return: Dictionary of monitored containers.
     """
     if containers is None:
-        containers = client.containers.list(all=True)
+        containers = [record_from_summary(summary, endpoint) for summary in list_containers(endpoint)]
 
     if executor is None:
-        executor = get_executor()
+        executor = get_executor(endpoint)
 
     if executor[0] == Context.host:
         # If running on host, monitor all containers regardless of context (tag filtering still applies)
@@ -147,7 +309,7 @@ def get_monitored(containers: List[Container] | None = None, tag_filter: List[st
 
     monitored: MONITORING_TYPE = {}
     for container in filter_by_tags(containers, tag_filter):
-        container_context, container_context_name = get_container_context(container)
+        container_context, container_context_name = container.context, container.context_name
 
         # Todo: If executed as single container in compose/stack, this would result in no monitored containers.
         # Decide if this is the desired behavior. Probably sensible to add config option to allow cross-boundary monitoring on single container stacks/compose setups.
@@ -40,6 +40,24 @@ class ContainerState(BaseModel):
     status: str = Field()
     since: int = Field()
 
+class ContainerStatusChange(BaseModel):
+    """
+    A status transition of a container, as reported by the Docker event stream.
+    """
+    container_id: str
+    status: str = Field()  # created, running, paused, exited, ...
+    timestamp: int = Field()  # Nanoseconds since epoch, like Log.timestamp
+    exit_code: int | None = Field(default=None)
+    oom_killed: bool = Field(default=False)
+    health: str | None = Field(default=None)  # starting, healthy or unhealthy, for containers with a health check
+
+class ContainerStatusTransfer(BaseModel):
+    """
+    This class is used by the api endpoint to receive status transitions of several containers in a single transfer.
+    """
+    agent_id: str
+    changes: list[ContainerStatusChange]
+
 ### Logging Models ###
 
 class Log(BaseModel):
@@ -51,6 +69,7 @@ class Log(BaseModel):
     timestamp: int = Field()
     level: str = Field()
     message: str = Field()
+    attributes: dict[str, str] | None = Field(default=None)  # Fields extracted from structured (json/logfmt/access) lines
 
 class MultilineLogTransfer(BaseModel):
     """
@@ -64,4 +83,29 @@ class MultiContainerLogTransfer(BaseModel):
     This class is used by the api endpoint to receive logs from multiple containers in a single transfer.
     """
     agent_id: str
-    container_logs: list[MultilineLogTransfer]
\ No newline at end of file
+    container_logs: list[MultilineLogTransfer]
+
+class MessageFingerprint(BaseModel):
+    """
+    A message template (variable parts replaced by `*`) and how often it was seen.
+    """
+    fingerprint: str
+    template: str
+    count: int
+
+class LogSummary(BaseModel):
+    """
+    Per-level line counts of a container in one time bucket. Summaries for the same bucket are additive.
+    """
+    container_id: str
+    bucket_start: int = Field()  # Nanoseconds since epoch, like Log.timestamp
+    bucket_seconds: int = Field()
+    counts: dict[str, int]
+    top_messages: list[MessageFingerprint] = Field(default_factory=list)
+
+class LogSummaryTransfer(BaseModel):
+    """
+    This class is used by the api endpoint to receive pre-aggregated log summaries of an agent.
+    """
+    agent_id: str
+    summaries: list[LogSummary]
@@ -1,6 +1,5 @@
 from enum import Enum
 
-from docker.models.containers import Container
 class DockerContainerStatuses(Enum):
     CREATED = 'created'
     RUNNING = 'running'
@@ -17,4 +16,27 @@ class Context(Enum):
     stack = "stack"
     host = "host"
 
-MONITORING_TYPE = dict[Context, dict[str | None, list[Container]]]
\ No newline at end of file
+class ContainerRecord:
+    """
+    Compact description of a container, used in the discovery and collection hot paths instead of docker-py
+    `Container` objects (which carry the whole inspect `attrs` blob).
+    Only labels the agent acts on are kept (see `docker_api.RETAINED_LABELS`).
+    """
+    __slots__ = ('id', 'name', 'image', 'status', 'created', 'labels', 'context', 'context_name', 'endpoint')
+
+    def __init__(self, id: str, name: str, image: str, status: str, created: int, labels: dict[str, str],
+                 context: Context = Context.orphan, context_name: str | None = None, endpoint: str = "default"):
+        self.id = id
+        self.name = name
+        self.image = image
+        self.status = status
+        self.created = created
+        self.labels = labels
+        self.context = context
+        self.context_name = context_name
+        self.endpoint = endpoint  # Docker endpoint the container runs on, see `docker_api.get_endpoints`
+
+    def __repr__(self):
+        return f"ContainerRecord({self.name}, {self.id[:12]}, {self.status})"
+
+MONITORING_TYPE = dict[Context, dict[str | None, list[ContainerRecord]]]
\ No newline at end of file
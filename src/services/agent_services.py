@@ -3,155 +3,164 @@ import time
 import logging
 
 from src.config import Config
-from src.docker_api import get_monitored, get_executor
+from src.docker_api import DEFAULT_ENDPOINT, MONITORING_TAG, get_endpoints, get_monitored, get_executor, list_containers
 from src.model.api import Context as APIContext, Container as APIContainer
 from src.api import APIClient
+from src.services.container_registry import ContainerRegistry
 from src.services.log_collector import LogCollector
-from src.model.model import Context as DiscoveryContext
+from src.services.status_tracker import StatusTracker
+from src.services.watchdog import watchdog
+from src.model.model import Context as DiscoveryContext, ContainerRecord
 
 logger = logging.getLogger(__name__)
 
 class DiscoveryService:
-    def __init__(self, api_client: APIClient, log_collector: LogCollector, agent_id: str):
+    def __init__(self, api_client: APIClient, log_collector: LogCollector, agent_id: str, endpoints: list[str] | None = None):
         self.api_client = api_client
         self.log_collector = log_collector
         self.agent_id = agent_id
+        self.endpoints = endpoints or get_endpoints()
         self.running = False
-        self.thread = None
-        self.lock = threading.Lock()
+        self.threads = []
+        self.lock = threading.Lock()  # Guards the registration state shared by the endpoint loops
 
         # Local state to track what's registered
-        self.registered_contexts = {} # name -> id
+        self.registered_contexts = {} # (endpoint, name) -> id
 
         for ctx in self.api_client.get_contexts(self.agent_id):
-            self.registered_contexts[ctx.name] = ctx.id
+            self.registered_contexts[self._context_key(ctx.name)] = ctx.id
 
         self.registered_containers = set() # id
 
         for cont in self.api_client.get_containers(self.agent_id):
             self.registered_containers.add(cont.id)
 
-        self.container_statuses = {} # id -> status
+        # Status transitions from the Docker event stream, with the discovery poll as fallback
+        self.status_tracker = StatusTracker(api_client, agent_id, self.endpoints)
+
+        # Monitored container ids per endpoint, as of the last successful discovery of that endpoint
+        self.endpoint_containers: dict[str, set[str]] = {}
 
     def start(self):
         self.running = True
-        self.thread = threading.Thread(target=self._discovery_loop, daemon=True)
-        self.thread.start()
+        self.status_tracker.start()
+        # One loop per endpoint, so a slow or unreachable daemon only delays its own discovery
+        for endpoint in self.endpoints:
+            # A cycle may wait for a slow daemon, but has to complete eventually, even if the daemon is unreachable
+            watchdog.register(f"discovery:{endpoint}", max(60, 10 * Config.DISCOVERY_INTERVAL))
+            thread = threading.Thread(target=self._discovery_loop, args=(endpoint,), name=f"discovery-{endpoint}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
 
     def stop(self):
         self.running = False
-        if self.thread:
-            self.thread.join()
+        for thread in self.threads:
+            thread.join()
+        self.status_tracker.stop()
         logger.info("Discovery Service stopped.")
 
-    def _discovery_loop(self):
-        logger.info("Starting Discovery Service loop")
-        executor = get_executor()
-
-        if executor[0] == DiscoveryContext.host:
-            logger.warning("Discovery Service is running on host context; cross-stack monitoring enabled.")
+    def _discovery_loop(self, endpoint: str):
+        logger.info(f"Starting Discovery Service loop for Docker endpoint {endpoint}")
+        # Compact records of all containers on the daemon, diffed every cycle
+        registry = ContainerRegistry(endpoint)
+        executor = None
+        monitored_ids = set()  # Containers handed to the log collector
+        pending = {}  # id -> monitored container whose context or container registration failed, retried every cycle
+        tagged = None  # Whether any container carried the monitoring tag in the last cycle, None to re-evaluate all
 
         def inner_loop():
+            nonlocal executor, tagged
             try:
-                logger.debug("Running discovery...")
+                logger.debug(f"Running discovery on {endpoint}...")
                 
                 try:
-                    monitored_data = get_monitored(cross_containerization_bounds=False)
+                    summaries = list_containers(endpoint)
+                    if executor is None:
+                        # Resolved once the daemon answered, so an unreachable daemon is not cached as the executor's context
+                        executor = get_executor(endpoint)
+                        if executor[0] == DiscoveryContext.host:
+                            logger.warning(f"Discovery Service is running on host context for {endpoint}; cross-stack monitoring enabled.")
                 except Exception as de:
-                    logger.error(f"Failed to communicate with Docker: {de}")
+                    logger.error(f"Failed to communicate with Docker at {endpoint}: {de}")
                     return # Exit inner_loop and wait for next interval
-                
-                current_container_ids = set()
-                all_containers_list = []
-
-                for context_enum, stacks in monitored_data.items():
-                    for context_name, containers in stacks.items():
-
-                        # Check if context is registered
-                        # If not, register it and get its ID
-                        ctx_id: str | None = None
-
-                        # Orphans have no context to register on server
-                        if context_enum != DiscoveryContext.orphan:
-                            if context_name not in self.registered_contexts:
-                                # Register Context
-                                api_context = APIContext(
-                                    agent_id=self.agent_id,
-                                    name=context_name,
-                                    type=context_enum.value  # type: ignore
-                                )
-                                ctx_id = self.api_client.register_context(self.agent_id, api_context)
-                                if ctx_id:
-                                    self.registered_contexts[context_name] = ctx_id
-                            else:
-                                ctx_id = self.registered_contexts[context_name]
-
-                            if ctx_id is None:
+
+                diff = registry.update(summaries)
+                removed_ids = {c.id for c in diff.removed}
+                for container_id in removed_ids:
+                    pending.pop(container_id, None)
+
+                # Whether a container is monitored only depends on the container itself, unless the first tagged
+                # container appeared or the last one disappeared: then every container is evaluated again.
+                full = tagged is None or tagged != (registry.tagged > 0)
+                tagged = registry.tagged > 0
+                if full:
+                    pending.clear()
+                    candidates = list(registry)
+                else:
+                    candidates = diff.added + list(pending.values())
+                monitored_data = get_monitored(candidates, tag_filter=[MONITORING_TAG] if tagged else [],
+                                               cross_containerization_bounds=False, executor=executor)
+
+                current = []
+                added = []
+                with self.lock:
+                    for context_enum, stacks in monitored_data.items():
+                        for context_name, containers in stacks.items():
+                            ctx_id = self._register_context(context_enum, context_name, endpoint)
+                            if context_enum != DiscoveryContext.orphan and ctx_id is None:
                                 logger.error(f"Failed to register or retrieve context ID for {context_name}, skipping its containers.")
+                                pending.update((c.id, c) for c in containers)
                                 continue
 
-                        # Process Containers in this context
-
-                        for container in containers:
-                            # Only reload if we don't have it yet or it was previously active (to detect stop)
-                            # Actually, status might change without us knowing if we don't reload.
-                            # But reloading every 1s is too much. 
-                            # We'll reload only if it's new or every 10th discovery cycle for existing ones, 
-                            # OR we just accept that 'status' might be slightly stale if the docker list is stale.
-                            # Standard docker client list(all=True) is usually fresh enough for status.
-                            
-                            # Check if container is already registered
-                            # If not, register it
-                            # Then, check and update status if changed
-
-                            if container.id not in self.registered_containers:
-                                container.reload() # Fresh data for new container
-                                try:
-                                    created_str = container.attrs['Created'][:19]
-                                    created_ts = int(time.mktime(time.strptime(created_str, "%Y-%m-%dT%H:%M:%S")))
-                                except Exception as e:
-                                    logger.warning(f"Failed to parse created timestamp for {container.name}: {e}")
-                                    created_ts = int(time.time())
-
-
-                                api_container = APIContainer(
-                                    id=container.id,
-                                    agent_id=self.agent_id,
-                                    context=ctx_id,
-                                    name=container.name,
-                                    image=str(container.image.tags[0]) if container.image.tags else "unknown",
-                                    created_at=created_ts,
-                                )
-                                res = self.api_client.register_container(self.agent_id, api_container)
-                                if res:
-                                    self.registered_containers.add(container.id)
-                                    self.container_statuses[container.id] = container.status
-
-                            # Update Status
-                            current_status = container.status
-                            if self.container_statuses.get(container.id) != current_status:
-
-                                self.api_client.update_container_status(self.agent_id, container.id, current_status, int(time.time()))
-                                self.container_statuses[container.id] = current_status
-
-                            # Add to all containers list for log collector
-                            all_containers_list.append(container)
-                            current_container_ids.add(container.id)
-
-                # Update log collector
-                self.log_collector.update_monitored_containers(all_containers_list)
-
-                # Handle removed containers
-                removed_containers = self.registered_containers - current_container_ids
-                for container_id in removed_containers:
-                    logger.info(f"Container {container_id} removed, deleting from server")
-                    self.api_client.delete_container(self.agent_id, container_id)
-                    self.registered_containers.remove(container_id)
-                    if container_id in self.container_statuses:
-                        del self.container_statuses[container_id]
+                            # Process Containers in this context
+                            for container in containers:
+                                if self._register_container(container, ctx_id):
+                                    pending.pop(container.id, None)
+                                else:
+                                    pending[container.id] = container
+                                current.append(container)
+                                if container.id not in monitored_ids:
+                                    added.append(container)
+
+                    # Statuses of containers that were already registered
+                    changed = [c for c in diff.changed if c.id in monitored_ids]
+                    for container in changed:
+                        if container.id in self.registered_containers:
+                            self.status_tracker.observe(container.id, container.status, endpoint)
+
+                    dropped = monitored_ids - {c.id for c in current} if full else monitored_ids & removed_ids
+                    monitored_ids.difference_update(dropped)
+                    monitored_ids.update(c.id for c in added)
+
+                    # Handle removed containers
+                    if endpoint in self.endpoint_containers:
+                        removed_containers = dropped
+                    else:
+                        self.endpoint_containers[endpoint] = monitored_ids
+                        if len(self.endpoint_containers) == len(self.endpoints):
+                            # Every endpoint has reported once: containers registered by a previous run that no endpoint
+                            # claims are gone. Until then they may still belong to an endpoint that was not reached yet.
+                            claimed = set().union(*self.endpoint_containers.values())
+                            removed_containers = self.registered_containers - claimed
+                        else:
+                            removed_containers = set()
+                    for container_id in removed_containers & self.registered_containers:
+                        logger.info(f"Container {container_id} removed, deleting from server")
+                        self.api_client.delete_container(self.agent_id, container_id)
+                        self.registered_containers.remove(container_id)
+                        self.status_tracker.forget(container_id)
+
+                # Update log collector. A full evaluation also hands over the whole list, which repairs the collector
+                # after a failed cycle.
+                if full:
+                    self.log_collector.update_monitored_containers(current, endpoint)
+                else:
+                    self.log_collector.update_containers(added, list(dropped), endpoint, changed)
 
             except Exception as e:
-                logger.error(f"Error in discovery loop: {e}")
+                # The diff of this cycle may be lost, so the next cycle evaluates every container again
+                tagged = None
+                logger.error(f"Error in discovery loop for {endpoint}: {e}")
                 import traceback
                 traceback.print_exc()
 
@@ -161,8 +170,69 @@ class DiscoveryService:
                 time.sleep(.25)
                 continue
             inner_loop()
+            watchdog.beat(f"discovery:{endpoint}")
             last_run = time.time()
 
+    def _register_context(self, context_enum: DiscoveryContext, context_name: str | None, endpoint: str) -> str | None:
+        """
+        Checks if the context is registered, if not, registers it.
+        Orphans have no context to register on server.
+        Contexts are per endpoint: equally named stacks on different daemons are different contexts.
+        :return: ID of the context, or None for orphans and failed registrations
+        """
+        if context_enum == DiscoveryContext.orphan:
+            return None
+        key = (endpoint, context_name)
+        if key in self.registered_contexts:
+            return self.registered_contexts[key]
+
+        api_context = APIContext(
+            agent_id=self.agent_id,
+            name=self._context_name(endpoint, context_name),
+            type=context_enum.value  # type: ignore
+        )
+        ctx_id = self.api_client.register_context(self.agent_id, api_context)
+        if ctx_id:
+            self.registered_contexts[key] = ctx_id
+        return ctx_id
+
+    @staticmethod
+    def _context_name(endpoint: str, context_name: str) -> str:
+        """
+        :return: Name the context is registered with, qualified with its endpoint unless that is the default one
+        """
+        return context_name if endpoint == DEFAULT_ENDPOINT else f"{context_name}@{endpoint}"
+
+    @staticmethod
+    def _context_key(name: str) -> tuple[str, str]:
+        """
+        Inverse of `_context_name`. Compose project and stack names cannot contain "@".
+        :return: (endpoint, context name) of a registered context
+        """
+        context_name, _, endpoint = name.partition("@")
+        return endpoint or DEFAULT_ENDPOINT, context_name
+
+    def _register_container(self, container: ContainerRecord, ctx_id: str | None) -> bool:
+        """
+        Registers the container if it is not registered yet and starts tracking its status.
+        :return: Whether the container is registered
+        """
+        if container.id not in self.registered_containers:
+            api_container = APIContainer(
+                id=container.id,
+                agent_id=self.agent_id,
+                context=ctx_id,
+                name=container.name,
+                image=container.image,
+                created_at=container.created or int(time.time()),
+            )
+            res = self.api_client.register_container(self.agent_id, api_container)
+            if not res:
+                return False
+            self.registered_containers.add(container.id)
+            self.status_tracker.track(container.id, container.status)
+        return True
+
 class HeartbeatService:
     def __init__(self, api_client: APIClient, agent_id: str):
         self.api_client = api_client
@@ -172,6 +242,7 @@ class HeartbeatService:
 
     def start(self):
         self.running = True
+        watchdog.register("heartbeat", max(60, 3 * Config.HEARTBEAT_INTERVAL))
         self.thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
         self.thread.start()
 
@@ -193,4 +264,5 @@ class HeartbeatService:
             except Exception as e:
                 logger.error(f"Error sending heartbeat: {e}")
             finally:
+                watchdog.beat("heartbeat")
                 last_run = time.time()
\ No newline at end of file
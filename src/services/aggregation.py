@@ -0,0 +1,100 @@
+import re
+import threading
+import time
+import zlib
+
+from src.model.api import LogSummary, MessageFingerprint
+
+# Variable parts of messages, replaced to group lines that only differ in ids, numbers, addresses, ...
+_VARIABLE_PATTERN = re.compile(
+    r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'  # UUIDs
+    r'|\b(?:\d{1,3}\.){3}\d{1,3}\b'  # IPv4 addresses
+    r'|\b0x[0-9a-fA-F]+\b|\b[0-9a-fA-F]{12,}\b'  # Hex ids and hashes
+    r'|"[^"]*"|\'[^\']*\''  # Quoted strings
+    r'|\d+(?:\.\d+)?'  # Numbers
+)
+TEMPLATE_LENGTH = 200
+
+
+def fingerprint(message: str) -> tuple[str, str]:
+    """
+    Reduces a message to a template without variable parts.
+    :return: (fingerprint, template)
+    """
+    template = _VARIABLE_PATTERN.sub('*', message[:4 * TEMPLATE_LENGTH])[:TEMPLATE_LENGTH]
+    return f"{zlib.crc32(template.encode('utf-8')):08x}", template
+
+
+class _Bucket:
+    """
+    Counters of one container in one time bucket.
+    Top messages are tracked with the Space-Saving algorithm, so memory stays bounded at `capacity` fingerprints.
+    """
+    __slots__ = ('counts', 'top', 'capacity')
+
+    def __init__(self, capacity: int):
+        self.counts: dict[str, int] = {}
+        self.top: dict[str, list] = {}  # fingerprint -> [count, template]
+        self.capacity = capacity
+
+    def add(self, level: str, message: str):
+        self.counts[level] = self.counts.get(level, 0) + 1
+
+        key, template = fingerprint(message)
+        entry = self.top.get(key)
+        if entry is not None:
+            entry[0] += 1
+        elif len(self.top) < self.capacity:
+            self.top[key] = [1, template]
+        else:
+            # Replace the least frequent fingerprint, inheriting its count as upper bound of the error
+            victim = min(self.top, key=lambda k: self.top[k][0])
+            count = self.top.pop(victim)[0]
+            self.top[key] = [count + 1, template]
+
+
+class LogAggregator:
+    """
+    Rolling per-container, per-level line counters in fixed time buckets, plus the top-k message fingerprints.
+    Buckets are keyed by the log timestamp and handed out by `collect` once they are closed.
+    Lines arriving after their bucket was collected open a new partial bucket, so summaries are additive.
+    """
+
+    def __init__(self, bucket_seconds: int = 60, top_k: int = 10, grace_seconds: int = 5):
+        self.bucket_ns = bucket_seconds * 10**9
+        self.top_k = top_k
+        self.grace_ns = grace_seconds * 10**9
+        self.buckets: dict[tuple[str, int], _Bucket] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, container_id: str, timestamp: int, level: str, message: str):
+        start = timestamp - timestamp % self.bucket_ns
+        with self.lock:
+            bucket = self.buckets.get((container_id, start))
+            if bucket is None:
+                bucket = self.buckets[(container_id, start)] = _Bucket(2 * self.top_k)
+            bucket.add(level, message)
+
+    def collect(self, flush: bool = False) -> list[LogSummary]:
+        """
+        Removes and returns the summaries of closed buckets.
+        :param flush: Also return buckets that are still open (e.g. on shutdown).
+        """
+        cutoff = time.time_ns() - self.bucket_ns - self.grace_ns
+        with self.lock:
+            keys = [key for key in self.buckets if flush or key[1] <= cutoff]
+            closed = [(key, self.buckets.pop(key)) for key in keys]
+
+        return [
+            LogSummary(
+                container_id=container_id,
+                bucket_start=start,
+                bucket_seconds=self.bucket_ns // 10**9,
+                counts=bucket.counts,
+                top_messages=[
+                    MessageFingerprint(fingerprint=key, template=template, count=count)
+                    for key, (count, template) in sorted(bucket.top.items(), key=lambda item: -item[1][0])[:self.top_k]
+                ],
+            )
+            for (container_id, start), bucket in closed
+        ]
@@ -0,0 +1,183 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from src.config import Config
+from src.docker_api import STREAM, get_client, get_monitored, list_containers, record_from_summary
+from src.model.model import ContainerRecord
+from src.services.log_parser import parse_docker_timestamp
+from src.services.pipeline import ContainerPipeline
+from src.services.scheduling import RateLimiter
+from src.services.spool import LogSpool
+
+logger = logging.getLogger(__name__)
+
+_DURATION = re.compile(r'^(\d+(?:\.\d+)?)([smhdw])$')
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_time(value: str, now: float | None = None) -> float:
+    """
+    Parses a point in time: a duration ago (`90m`, `6h`, `2d`), an ISO 8601 timestamp (UTC if no offset is given)
+    or epoch seconds.
+    :return: Epoch seconds
+    :raise: ValueError: If the value is none of these
+    """
+    now = time.time() if now is None else now
+    value = value.strip()
+    match = _DURATION.match(value)
+    if match:
+        return now - float(match.group(1)) * _UNITS[match.group(2)]
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_duration(value: str) -> float:
+    """
+    :return: Seconds of a duration like `15m`
+    :raise: ValueError: If the value is not a positive duration
+    """
+    match = _DURATION.match(value.strip())
+    if not match or float(match.group(1)) <= 0:
+        raise ValueError(f"Invalid duration: {value}")
+    return float(match.group(1)) * _UNITS[match.group(2)]
+
+
+def resolve_containers(names: list[str], endpoint: str) -> list[ContainerRecord]:
+    """
+    Resolves containers by name or (prefix of) id. Without names, all monitored containers of the endpoint.
+    :raise: ValueError: If a name matches no container
+    """
+    records = [record_from_summary(summary, endpoint) for summary in list_containers(endpoint)]
+    if not names:
+        monitored = get_monitored(records, endpoint=endpoint)
+        return [c for stacks in monitored.values() for containers in stacks.values() for c in containers]
+
+    resolved = []
+    for name in names:
+        matches = [r for r in records if r.name == name or r.id.startswith(name)]
+        if not matches:
+            raise ValueError(f"No container named {name} on {endpoint}")
+        if len(matches) > 1:
+            raise ValueError(f"{name} is ambiguous on {endpoint}: {', '.join(m.name for m in matches)}")
+        resolved.append(matches[0])
+    return resolved
+
+
+class Backfill:
+    """
+    Fetches historical logs of containers into the spool's `backfill_logs` queue, which the running agent uploads
+    whenever live logs leave room in a batch.
+
+    The time range is split into chunks that are fetched concurrently from the daemon (`since`/`until`), while
+    rows are inserted in chunk order, so every container's rows are queued oldest first. At most a window of
+    `2 * concurrency` chunks is in flight, which bounds memory. All fetches share one rate limit.
+    """
+
+    def __init__(self, containers: list[ContainerRecord], since: float, until: float, chunk_seconds: float,
+                 concurrency: int, rate: float):
+        self.containers = containers
+        self.since = since
+        self.until = until
+        self.chunk_seconds = chunk_seconds
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate, rate, "delay")
+        self.stop_event = threading.Event()
+        self.spool = LogSpool(os.path.join(os.path.dirname(Config.AGENT_ID_FILE), 'logs.db'), table="backfill_logs")
+
+    def chunks(self) -> list[tuple[ContainerRecord, float, float]]:
+        chunks = []
+        for container in self.containers:
+            start = self.since
+            while start < self.until:
+                end = min(start + self.chunk_seconds, self.until)
+                chunks.append((container, start, end))
+                start = end
+        return chunks
+
+    def run(self) -> int:
+        """
+        :return: Number of queued rows
+        """
+        chunks = self.chunks()
+        logger.info(f"Backfilling {len(self.containers)} containers in {len(chunks)} chunks")
+        queued = 0
+        started = time.time()
+        window: deque[tuple[tuple, Future]] = deque()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="backfill") as executor:
+            pending = iter(chunks)
+            for done in range(1, len(chunks) + 1):
+                while len(window) < 2 * self.concurrency:
+                    next_chunk = next(pending, None)
+                    if next_chunk is None:
+                        break
+                    window.append((next_chunk, executor.submit(self._fetch, *next_chunk)))
+
+                (container, start, end), future = window.popleft()
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to fetch logs of {container.name} from {_format(start)} to {_format(end)}: {e}")
+                    rows = []
+                if rows:
+                    self.spool.insert(rows)
+                queued += len(rows)
+                logger.info(f"[{done}/{len(chunks)}] {container.name} {_format(start)} - {_format(end)}: {len(rows)} lines")
+                if self.stop_event.is_set():
+                    logger.warning("Backfill interrupted")
+                    for _, future in window:
+                        future.cancel()
+                    break
+
+        self.spool.close()
+        logger.info(f"Queued {queued} lines for upload in {time.time() - started:.1f}s")
+        return queued
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _fetch(self, container: ContainerRecord, start: float, end: float) -> list[tuple]:
+        if self.stop_event.is_set():
+            return []
+        pipeline = ContainerPipeline(container, limiter=self.limiter)
+        # since/until are inclusive on the daemon, lines on a chunk boundary are kept by one chunk only
+        start_ns, end_ns = int(start * 10**9), int(end * 10**9)
+        logs = get_client(container.endpoint, STREAM).api.logs(
+            container.id, stream=True, follow=False, timestamps=True, since=start, until=end
+        )
+        rows = []
+        try:
+            for line in logs:
+                if self.stop_event.is_set():
+                    break
+                parts = line.decode('utf-8', errors='replace').split(' ', 1)
+                if len(parts) != 2:
+                    continue
+                try:
+                    ts_ns = parse_docker_timestamp(parts[0])
+                except ValueError:
+                    continue
+                if not start_ns <= ts_ns < end_ns and not (end == self.until and ts_ns == end_ns):
+                    continue
+                row = pipeline.process(parts[0], parts[1], self.stop_event)
+                if row:
+                    rows.append(row)
+        finally:
+            logs.close()
+            pipeline.report()
+        return rows
+
+
+def _format(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
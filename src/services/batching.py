@@ -0,0 +1,112 @@
+import logging
+from typing import Callable
+
+from src.config import Config
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+INCREASE_INTERVAL = 0.1  # Seconds added to the flush interval per full batch
+DECREASE_FACTOR = 0.5  # Multiplier of the batch size on congestion, and of the flush interval while idle
+RATE_SMOOTHING = 0.3  # Weight of the newest sample in moving averages
+MIN_BACKOFF = 1.0
+
+
+class AdaptiveBatching:
+    """
+    Upload batch size and flush timing tuned with additive increase, multiplicative decrease (AIMD),
+    as in TCP congestion control.
+
+    Batch size: every full batch uploaded within `target_latency` grows it by `min_batch` rows, so a backlog is
+    drained with fewer, larger requests. Slow responses, 429, 5xx and connection errors halve it, 413 halves it
+    without backing off. Failures back off exponentially from `MIN_BACKOFF` to `max_backoff` seconds.
+
+    Flush interval: the longest time a line waits in a reader before it is committed, and the sender's idle sleep.
+    It grows with every full batch and halves whenever the sender finds nothing to upload, so a quiet host ships
+    lines quickly and a busy one amortizes commits and requests. Readers also flush once they hold the number of
+    lines they read per interval at their ingest rate (`flush_rows`), so a quiet stream commits every line right away.
+    When rows are persisted, every flush is a spool transaction synced to disk, so readers hold at least `min_batch`
+    lines unless the flush interval passes first: a quiet stream's lines then wait up to one flush interval before
+    they are committed, instead of costing a disk sync each.
+    """
+
+    def __init__(self, min_batch: int, max_batch: int, min_interval: float, max_interval: float,
+                 target_latency: float, max_backoff: float):
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_latency = target_latency
+        self.max_backoff = max_backoff
+
+        self.size = float(min(max(100, min_batch), max_batch))
+        self.flush_interval = min(max(1.0, min_interval), max_interval)
+        self.backoff = 0.0
+        self.latency = 0.0  # Moving average of upload latency
+        self.listeners: list[Callable[[float], None]] = []  # Called with the new flush interval on every change
+
+    @classmethod
+    def from_config(cls) -> "AdaptiveBatching":
+        return cls(Config.BATCH_MIN, Config.BATCH_MAX, Config.FLUSH_INTERVAL_MIN, Config.FLUSH_INTERVAL_MAX,
+                   Config.TARGET_LATENCY, Config.BACKOFF_MAX)
+
+    @property
+    def batch_size(self) -> int:
+        return int(self.size)
+
+    def flush_rows(self, rate: float, persist: bool = False) -> int:
+        """
+        :param rate: Ingest rate of a reader in lines per second
+        :param persist: Whether every flush is written to the spool
+        :return: Lines after which the reader flushes, before its flush interval has passed
+        """
+        return int(min(max(rate * self.flush_interval, self.min_batch if persist else 1), self.max_batch))
+
+    def set_flush_interval(self, interval: float):
+        """
+        Follows the flush interval of another instance, for worker processes whose rows are uploaded by the parent.
+        """
+        self._set_interval(min(max(interval, self.min_interval), self.max_interval))
+        self._publish()
+
+    def on_upload(self, latency: float, status: int | None, full: bool):
+        """
+        :param latency: Seconds the upload took
+        :param status: HTTP status of the response, None if there was none (connection error, timeout)
+        :param full: Whether the batch was filled up to the batch size, i.e. there is a backlog
+        """
+        self.latency = latency if not self.latency else RATE_SMOOTHING * latency + (1 - RATE_SMOOTHING) * self.latency
+        metrics.inc("clogs_upload_requests_total", status=str(status) if status is not None else "error")
+        if status is not None and 200 <= status < 300:
+            self.backoff = 0.0
+            if latency > self.target_latency:
+                self._decrease()
+            elif full:
+                self.size = min(self.size + self.min_batch, self.max_batch)
+                self._set_interval(min(self.flush_interval + INCREASE_INTERVAL, self.max_interval))
+        else:
+            self._decrease()
+            if status != 413:  # Too large a batch is retried smaller right away
+                self.backoff = min(max(self.backoff * 2, MIN_BACKOFF), self.max_backoff)
+        self._publish()
+
+    def on_idle(self):
+        if self.flush_interval > self.min_interval:
+            self._set_interval(max(self.flush_interval * DECREASE_FACTOR, self.min_interval))
+            self._publish()
+
+    def _set_interval(self, interval: float):
+        if interval == self.flush_interval:
+            return
+        self.flush_interval = interval
+        for listener in self.listeners:
+            listener(interval)
+
+    def _decrease(self):
+        self.size = max(self.size * DECREASE_FACTOR, self.min_batch)
+
+    def _publish(self):
+        metrics.set("clogs_upload_batch_size", self.batch_size)
+        metrics.set("clogs_flush_interval_seconds", self.flush_interval)
+        metrics.set("clogs_upload_latency_seconds", self.latency)
+        metrics.set("clogs_upload_backoff_seconds", self.backoff)
@@ -0,0 +1,199 @@
+import bisect
+import itertools
+import logging
+import threading
+
+from src.services.spool import LogSpool
+
+logger = logging.getLogger(__name__)
+
+
+class TieredBuffer:
+    """
+    Bounded in-memory buffer in front of the SQLite spool.
+
+    While the backend keeps up, rows are uploaded straight from memory and never touch the disk. Rows are spilled
+    to the spool when the buffer is full, when an upload fails and on shutdown. Per container, rows live either in
+    memory or in the spool: once a container has spooled rows, its new rows are spooled behind them until the
+    sender drained them, so every container's rows are uploaded in the order they were read.
+
+    Rows that are being uploaded stay at the head of their container's memory list until acknowledged. If they are
+    spilled during the upload, they become the container's oldest spooled rows and the acknowledgement deletes them
+    there instead (`LogSpool.ack_head`).
+
+    In persistent mode (`Config.ALWAYS_PERSIST`, and always with worker processes) every row is written to the
+    spool before it is uploaded, as without this buffer.
+    """
+
+    def __init__(self, spool: LogSpool, capacity: int, persist: bool = False):
+        self.spool = spool
+        self.capacity = capacity
+        self.persist = persist or capacity <= 0
+        self.lock = threading.Lock()
+        self.sequence = itertools.count(1)
+
+        self.memory: dict[str, list[tuple]] = {}  # container id -> (seq, container_id, timestamp, level, message, attributes) rows
+        self.memory_ids: list[str] = []  # Sorted keys of `memory`, for `next_container`
+        self.size = 0
+        self.inflight: dict[str, int] = {}  # container id -> rows fetched from memory for the current upload
+        self.checkpoints: dict[str, list[tuple[int, int, int]]] = {}  # container id -> (seq, inode, offset) not yet durable
+
+        # Containers with rows in the spool, e.g. left over from a previous run
+        self.spooled: set[str] = set()
+        container_id = spool.next_container("")
+        while container_id is not None:
+            self.spooled.add(container_id)
+            container_id = spool.next_container(container_id)
+
+    ### Ingestion ###
+
+    def insert(self, rows: list[tuple], checkpoint: tuple[str, int, int] | None = None):
+        """
+        Same as `LogSpool.insert`, rows of a single container.
+        The checkpoint is stored once the rows it covers were uploaded or spooled.
+        """
+        if self.persist:
+            self.spool.insert(rows, checkpoint)
+            return
+        if not rows and checkpoint is None:
+            return
+        container_id = rows[0][0] if rows else checkpoint[0]
+
+        with self.lock:
+            if container_id not in self.spooled and self.size + len(rows) > self.capacity:
+                logger.warning(f"In-memory log buffer is full, spilling {self.size} rows to disk")
+                self._spill()
+
+            if self.persist or container_id in self.spooled or len(rows) > self.capacity:
+                self.spool.insert(rows, checkpoint)
+                if rows:
+                    self.spooled.add(container_id)
+                return
+
+            container_rows = self.memory.get(container_id)
+            if container_rows is None:
+                if not rows:
+                    # Nothing of this container is pending, the checkpoint is durable right away
+                    self.spool.insert([], checkpoint)
+                    return
+                container_rows = self.memory[container_id] = []
+                bisect.insort(self.memory_ids, container_id)
+            container_rows.extend((next(self.sequence),) + row for row in rows)
+            self.size += len(rows)
+
+            if checkpoint:
+                self.checkpoints.setdefault(container_id, []).append((container_rows[-1][0],) + checkpoint[1:])
+
+    ### Sending ###
+
+    def next_container(self, after: str) -> str | None:
+        """
+        See `LogSpool.next_container`, over both tiers.
+        """
+        with self.lock:
+            index = bisect.bisect_right(self.memory_ids, after)
+            in_memory = self.memory_ids[index] if index < len(self.memory_ids) else None
+        in_spool = self.spool.next_container(after)
+        if in_memory is None or in_spool is None:
+            return in_memory or in_spool
+        return min(in_memory, in_spool)
+
+    def fetch(self, container_id: str, limit: int, after_id: int = 0) -> list[tuple]:
+        """
+        See `LogSpool.fetch`. Ids of rows in memory are sequence numbers and only meaningful to `ack`.
+        """
+        with self.lock:
+            container_rows = self.memory.get(container_id)
+            if container_rows is not None:
+                start = bisect.bisect_right(container_rows, after_id, key=lambda row: row[0])
+                rows = container_rows[start:start + limit]
+                self.inflight[container_id] = start + len(rows)
+                return rows
+        return self.spool.fetch(container_id, limit, after_id)
+
+    def ack(self, watermarks: dict[str, int]):
+        """
+        Acknowledges the upload of the last fetched rows.
+        :param watermarks: container id -> highest uploaded row id
+        """
+        with self.lock:
+            spool_watermarks = {}
+            spilled_counts = {}
+            checkpoints = []
+            for container_id, watermark in watermarks.items():
+                count = self.inflight.pop(container_id, None)
+                if count is None:
+                    spool_watermarks[container_id] = watermark
+                elif container_id in self.spooled:
+                    spilled_counts[container_id] = count
+                else:
+                    checkpoint = self._release(container_id, count, watermark)
+                    if checkpoint:
+                        checkpoints.append(checkpoint)
+            self.inflight.clear()
+
+            self.spool.ack(spool_watermarks)
+            if spilled_counts:
+                self.spool.ack_head(spilled_counts)
+            if checkpoints:
+                self.spool.insert([], *checkpoints)
+
+            # Containers whose spooled rows are all uploaded go back to the in-memory path
+            for container_id in itertools.chain(spool_watermarks, spilled_counts):
+                if container_id in self.spooled and not self.spool.has_rows(container_id):
+                    self.spooled.discard(container_id)
+
+    def fail(self):
+        """
+        The last upload failed: spill everything, so a backend outage does not pin rows in memory.
+        """
+        with self.lock:
+            self.inflight.clear()
+            if self.size:
+                logger.info(f"Upload failed, spilling {self.size} buffered rows to disk")
+                self._spill()
+
+    def close(self):
+        """
+        Spills the buffer and spools all further rows, for shutdown.
+        """
+        with self.lock:
+            self.persist = True
+            self.inflight.clear()
+            if self.size:
+                logger.info(f"Spilling {self.size} buffered rows to disk")
+                self._spill()
+
+    def _release(self, container_id: str, count: int, watermark: int) -> tuple[str, int, int] | None:
+        """
+        Drops uploaded rows from memory.
+        :return: The newest checkpoint covered by the uploaded rows, if any
+        """
+        container_rows = self.memory[container_id]
+        del container_rows[:count]
+        self.size -= count
+        if not container_rows:
+            del self.memory[container_id]
+            self.memory_ids.remove(container_id)
+
+        checkpoint = None
+        pending = self.checkpoints.get(container_id)
+        while pending and pending[0][0] <= watermark:
+            checkpoint = (container_id,) + pending.pop(0)[1:]
+        if not pending:
+            self.checkpoints.pop(container_id, None)
+        return checkpoint
+
+    def _spill(self):
+        """
+        Moves all rows in memory to the spool, together with their latest checkpoints. Must hold the lock.
+        """
+        rows = [row[1:] for container_rows in self.memory.values() for row in container_rows]
+        checkpoints = [(container_id,) + pending[-1][1:] for container_id, pending in self.checkpoints.items()]
+        self.spool.insert(rows, *checkpoints)
+
+        self.spooled.update(self.memory)
+        self.memory.clear()
+        self.memory_ids.clear()
+        self.checkpoints.clear()
+        self.size = 0
@@ -0,0 +1,62 @@
+import logging
+from typing import Iterable, NamedTuple
+
+from src.docker_api import DEFAULT_ENDPOINT, has_monitoring_tag, record_from_summary
+from src.model.model import ContainerRecord
+
+logger = logging.getLogger(__name__)
+
+
+class RegistryDiff(NamedTuple):
+    added: list[ContainerRecord]
+    removed: list[ContainerRecord]
+    changed: list[ContainerRecord]  # Status changed since the previous cycle
+
+
+class ContainerRegistry:
+    """
+    Container records of one Docker endpoint, kept between discovery cycles.
+
+    Records of known containers are reused and only updated in place when their status changes, so steady-state
+    memory stays flat and records are only allocated for containers that appeared. Callers act on the returned diff
+    instead of re-processing every container. The number of containers carrying the monitoring tag is kept as well,
+    since whether any container carries it decides which containers are monitored (see `docker_api.filter_by_tags`).
+    """
+
+    def __init__(self, endpoint: str = DEFAULT_ENDPOINT):
+        self.endpoint = endpoint
+        self.records: dict[str, ContainerRecord] = {}
+        self.tagged = 0  # Containers carrying the monitoring tag
+
+    def update(self, summaries: Iterable[dict]) -> RegistryDiff:
+        """
+        Applies the current container list.
+        :param summaries: Container summaries from `docker_api.list_containers`
+        :return: What changed since the previous update
+        """
+        added = []
+        changed = []
+        seen = set()
+        for summary in summaries:
+            container_id = summary['Id']
+            seen.add(container_id)
+            record = self.records.get(container_id)
+            if record is None:
+                record = self.records[container_id] = record_from_summary(summary, self.endpoint)
+                added.append(record)
+                self.tagged += has_monitoring_tag(record)
+            elif record.status != (summary.get('State') or "unknown"):
+                record.status = summary.get('State') or "unknown"
+                changed.append(record)
+
+        removed = [self.records.pop(container_id) for container_id in self.records.keys() - seen]
+        self.tagged -= sum(map(has_monitoring_tag, removed))
+        if added or removed or changed:
+            logger.debug(f"Registry update: {len(added)} added, {len(removed)} removed, {len(changed)} changed")
+        return RegistryDiff(added, removed, changed)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records.values())
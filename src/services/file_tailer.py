@@ -0,0 +1,191 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+
+from src.config import Config
+from src.docker_api import get_client
+from src.model.model import ContainerRecord
+
+logger = logging.getLogger(__name__)
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+def get_json_log_path(container: ContainerRecord) -> str | None:
+    """
+    Resolves the json-file log of a container below Config.DOCKER_CONTAINERS_DIR.
+    :param container: ContainerRecord to resolve the log file for.
+    :return: Path of the log file, or None if the container uses another log driver or the file is not readable.
+    """
+    try:
+        driver = get_client(container.endpoint).api.inspect_container(container.id)['HostConfig']['LogConfig']['Type']
+    except (KeyError, TypeError):
+        driver = None
+    except Exception as e:
+        logger.warning(f"Failed to inspect log driver of {container.name}: {e}")
+        return None
+    if driver != 'json-file':
+        logger.debug(f"Container {container.name} uses log driver {driver}, not tailing its log file.")
+        return None
+
+    path = os.path.join(Config.DOCKER_CONTAINERS_DIR, container.id, f"{container.id}-json.log")
+    if not os.access(path, os.R_OK):
+        logger.debug(f"Log file {path} of container {container.name} is not readable, not tailing it.")
+        return None
+    return path
+
+
+class Inotify:
+    """
+    Minimal ctypes wrapper around inotify, used to sleep until a watched directory changes.
+    """
+
+    _libc = None
+
+    def __init__(self, directory: str):
+        if Inotify._libc is None:
+            Inotify._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = Inotify._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CREATE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+        if Inotify._libc.inotify_add_watch(self.fd, directory.encode(), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Waits until an event arrives or the timeout passes, and drains pending events.
+        :return: True if an event arrived.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+    @classmethod
+    def create(cls, directory: str) -> "Inotify | None":
+        try:
+            return cls(directory)
+        except (OSError, AttributeError) as e:
+            logger.debug(f"inotify is not available for {directory}, falling back to polling: {e}")
+            return None
+
+
+class JsonFileTailer:
+    """
+    Tails a Docker json-file log, following the daemon's rotation scheme
+    (<id>-json.log is renamed to <id>-json.log.1 and a fresh file is created).
+
+    The position is tracked as (inode, offset), which callers persist as a checkpoint.
+    Only complete lines are consumed, so the offset always points at the start of a line.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, path: str, checkpoint: tuple[int, int] | None = None):
+        self.path = path
+        self.fd = None
+        self.inode = None
+        self.offset = 0
+        self._open(checkpoint)
+
+    def _open(self, checkpoint: tuple[int, int] | None):
+        current = os.open(self.path, os.O_RDONLY)
+        current_inode = os.fstat(current).st_ino
+
+        if checkpoint is None:
+            # No checkpoint: behave like `tail=0` and only read new lines
+            self._switch(current, current_inode, os.fstat(current).st_size)
+            return
+
+        inode, offset = checkpoint
+        if inode == current_inode:
+            self._switch(current, current_inode, offset)
+            return
+
+        # The checkpointed file may have been rotated while we were not running
+        try:
+            rotated = os.open(f"{self.path}.1", os.O_RDONLY)
+            if os.fstat(rotated).st_ino == inode:
+                os.close(current)
+                self._switch(rotated, inode, offset)
+                return
+            os.close(rotated)
+        except FileNotFoundError:
+            pass
+
+        logger.warning(f"Checkpointed log file of {self.path} is gone, resuming at the start of the current file")
+        self._switch(current, current_inode, 0)
+
+    def _switch(self, fd: int, inode: int, offset: int):
+        if self.fd is not None:
+            os.close(self.fd)
+        self.fd = fd
+        self.inode = inode
+        self.offset = offset
+
+    def read_lines(self) -> list[bytes]:
+        """
+        Reads the next chunk of complete lines, moving on to the new file once the current one was rotated.
+        :return: List of raw json lines, empty if there is nothing new.
+        """
+        lines = self._read_chunk()
+        if lines:
+            return lines
+
+        # At EOF: check whether the file we hold was rotated away or truncated
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+
+        if stat.st_ino != self.inode:
+            # Drain whatever was written before the rename, then follow the new file
+            lines = self._read_chunk()
+            if lines:
+                return lines
+            logger.debug(f"Log file {self.path} was rotated, following the new file")
+            self._switch(os.open(self.path, os.O_RDONLY), stat.st_ino, 0)
+            return self._read_chunk()
+
+        if stat.st_size < self.offset:
+            logger.warning(f"Log file {self.path} was truncated, restarting at offset 0")
+            self.offset = 0
+            return self._read_chunk()
+        return []
+
+    def _read_chunk(self) -> list[bytes]:
+        data = os.pread(self.fd, self.CHUNK_SIZE, self.offset)
+        end = data.rfind(b'\n')
+        if end < 0:
+            # Docker splits messages at 16KiB, so a full chunk without a newline means a corrupt file
+            if len(data) == self.CHUNK_SIZE:
+                logger.warning(f"Skipping oversized line in {self.path} at offset {self.offset}")
+                self.offset += len(data)
+            return []
+        self.offset += end + 1
+        return data[:end].split(b'\n')
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
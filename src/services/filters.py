@@ -0,0 +1,187 @@
+import logging
+import re
+from typing import Callable, NamedTuple
+
+from src.config import Config
+from src.model.model import ContainerRecord
+
+logger = logging.getLogger(__name__)
+
+_GLOBAL_FLAGS = re.compile(r'^\(\?([aiLmsux]+)\)')
+
+# Container labels, `<label>` or `<label>.<rule name>` for several named rules
+INCLUDE_LABEL = "clogs.filter.include"
+EXCLUDE_LABEL = "clogs.filter.exclude"
+REDACT_LABEL = "clogs.redact"
+
+class Redactor(NamedTuple):
+    pattern: str
+    keep: str | None = None  # Pattern of a prefix that is kept, e.g. the key of a key=value secret
+    hints: tuple[str, ...] | None = None  # Lowercase substrings every match contains, None if there are none
+    valid: Callable[[str], bool] | None = None  # Rejects matches the pattern is too loose for
+
+
+def _valid_ip(value: str) -> bool:
+    if '.' in value:
+        return all(int(octet) <= 255 for octet in value.split('.'))
+    # Without "::" only full 8-group addresses, so times (10:00:00) and MAC addresses are not redacted
+    return ('::' in value or value.count(':') == 7) and any(c not in ':' for c in value)
+
+
+# Built-in redactors
+REDACTORS: dict[str, Redactor] = {
+    "token": Redactor(
+        r'(?i:\bbearer\s+[\w.~+/-]+=*'
+        r'|\beyJ[\w-]+\.eyJ[\w-]+\.[\w-]+'  # JWT
+        r'|\bAKIA[0-9A-Z]{16}\b'  # AWS access key id
+        r'|\bgh[pousr]_[A-Za-z0-9]{36,}\b'  # GitHub token
+        r'|\b(?:api[_-]?key|access[_-]?key|secret|token|password|passwd|pwd)["\']?\s*[:=]\s*["\']?[^\s"\'&,;]+)',
+        keep=r'(?i:bearer\s+|[\w-]+["\']?\s*[:=]\s*["\']?)',
+        hints=("bearer", "eyj", "akia", "gh", "key", "secret", "token", "passw", "pwd"),
+    ),
+    "email": Redactor(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b', hints=("@",)),
+    "ip": Redactor(
+        r'(?<![\w.:])(?:\d{1,3}(?:\.\d{1,3}){3}|[0-9a-fA-F]{0,4}(?::[0-9a-fA-F]{0,4}){2,7})(?![\w.:])',
+        valid=_valid_ip,
+    ),
+}
+
+
+class _RuleSet:
+    """
+    Rules combined into one alternation with a named group per rule, so a line is scanned once
+    regardless of the number of rules, and `lastgroup` tells which rule matched.
+    """
+
+    def __init__(self, rules: dict[str, str], container_name: str):
+        self.names: dict[str, str] = {}  # group name -> rule name
+        alternatives = []
+        for rule, pattern in rules.items():
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                logger.warning(f"Invalid filter pattern for rule {rule} on {container_name}, ignoring it: {e}")
+                continue
+            # Leading global flags such as (?i) are only allowed at the start of the combined pattern, scope them
+            flags = _GLOBAL_FLAGS.match(pattern)
+            if flags:
+                pattern = f"(?{flags.group(1)}:{pattern[flags.end():]})"
+            group = f"_{len(self.names)}"
+            self.names[group] = rule
+            alternatives.append(f"(?P<{group}>{pattern})")
+
+        self.pattern = None
+        if alternatives:
+            try:
+                self.pattern = re.compile("|".join(alternatives))
+            except re.error as e:
+                # e.g. a rule with a named group that clashes with ours
+                logger.warning(f"Filter rules of {container_name} cannot be combined, ignoring them: {e}")
+                self.names = {}
+
+    def __bool__(self):
+        return self.pattern is not None
+
+    def search(self, line: str) -> str | None:
+        """
+        :return: Name of the first matching rule, or None
+        """
+        match = self.pattern.search(line)
+        return self.names[match.lastgroup] if match else None
+
+
+class ContainerFilter:
+    """
+    Include/exclude filters and redaction of one container, configured from `CLOGS_AGENT_FILTER_*`,
+    `CLOGS_AGENT_REDACT` and the container's labels.
+
+    A line is kept if it matches an include rule (when there are any) and no exclude rule. Kept lines are then
+    redacted with all enabled redactors in a single pass. Hits are counted per action and rule.
+    """
+
+    def __init__(self, container: ContainerRecord):
+        labels = container.labels or {}
+        self.hits: dict[tuple[str, str], int] = {}  # (action, rule) -> hits since the last `take_hits`
+
+        self.include = _RuleSet(self._rules(labels, INCLUDE_LABEL, Config.FILTER_INCLUDE), container.name)
+        self.exclude = _RuleSet(self._rules(labels, EXCLUDE_LABEL, Config.FILTER_EXCLUDE), container.name)
+
+        # Built-in redactors by name, plus custom patterns from `clogs.redact.<name>` labels
+        enabled = labels.get(REDACT_LABEL, Config.REDACT)
+        redactors: dict[str, Redactor] = {}
+        for name in (n.strip().lower() for n in enabled.split(',')):
+            if name in REDACTORS:
+                redactors[name] = REDACTORS[name]
+            elif name and name not in ("none", "false"):
+                logger.warning(f"Unknown redactor '{name}' on {container.name}, known are {', '.join(REDACTORS)}")
+        for key, value in labels.items():
+            if key.startswith(REDACT_LABEL + "."):
+                redactors[key[len(REDACT_LABEL) + 1:]] = Redactor(value)
+
+        self.redactors = redactors
+        self.keep_prefix = {name: re.compile(r.keep) for name, r in redactors.items() if r.keep}
+        self.redactions = _RuleSet({name: r.pattern for name, r in redactors.items()}, container.name)
+        # Lines without any hint cannot contain a match, which spares most lines the regex scan
+        self.hints = None
+        if redactors and all(r.hints for r in redactors.values()):
+            self.hints = tuple(hint for r in redactors.values() for hint in r.hints)
+
+    @staticmethod
+    def _rules(labels: dict[str, str], label: str, default: str) -> dict[str, str]:
+        rules = {}
+        if default:
+            rules["global"] = default
+        for key, value in labels.items():
+            if key == label:
+                rules["default"] = value
+            elif key.startswith(label + "."):
+                rules[key[len(label) + 1:]] = value
+        return rules
+
+    def __bool__(self):
+        return bool(self.include or self.exclude or self.redactions)
+
+    def keep(self, line: str) -> bool:
+        if self.include:
+            rule = self.include.search(line)
+            if rule is None:
+                self._hit("not_included", "*")
+                return False
+            self._hit("include", rule)
+        if self.exclude:
+            rule = self.exclude.search(line)
+            if rule is not None:
+                self._hit("exclude", rule)
+                return False
+        return True
+
+    def redact(self, line: str) -> str:
+        if not self.redactions:
+            return line
+        if self.hints is not None:
+            lower = line.lower()
+            if not any(hint in lower for hint in self.hints):
+                return line
+        return self.redactions.pattern.sub(self._replace, line)
+
+    def _replace(self, match: re.Match) -> str:
+        rule = self.redactions.names[match.lastgroup]
+        valid = self.redactors[rule].valid
+        if valid and not valid(match.group()):
+            return match.group()
+        self._hit("redact", rule)
+        replacement = f"[REDACTED:{rule}]"
+        prefix = self.keep_prefix.get(rule)
+        if prefix:
+            kept = prefix.match(match.group())
+            if kept:
+                return kept.group() + replacement
+        return replacement
+
+    def _hit(self, action: str, rule: str):
+        key = (action, rule)
+        self.hits[key] = self.hits.get(key, 0) + 1
+
+    def take_hits(self) -> dict[tuple[str, str], int]:
+        hits, self.hits = self.hits, {}
+        return hits
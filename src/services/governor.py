@@ -0,0 +1,346 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable
+
+from src.config import Config
+from src.services.metrics import metrics
+from src.services.pipeline import FULL, PAUSED, SAMPLED, SUMMARY, ContainerPipeline
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+# Degradation levels, each one adds to the measures of the previous ones:
+# relaxed: longer flush intervals and larger upload batches
+# sampling: noisy containers keep only a sample of their lines (warnings and errors are always kept)
+# shedding: noisy containers are only summarized, streams of low priority containers are paused
+NORMAL, RELAXED, SAMPLING, SHEDDING = range(4)
+LEVELS = ("normal", "relaxed", "sampling", "shedding")
+INTERVAL_FACTORS = (1, 2, 4, 4)
+
+HIGH_WATERMARK = 0.9  # Pressure (usage / budget) at which the level is raised
+LOW_WATERMARK = 0.7  # Pressure under which the level is lowered again
+ESCALATE_TICKS = 2  # Consecutive ticks over the high watermark before raising the level
+RECOVER_TICKS = 5  # Consecutive ticks under the low watermark before lowering the level
+NOISY_SHARE = 0.8  # The loudest containers that together produce this share of all lines are noisy
+NOISY_MIN_RATE = 20  # Lines per second under which a container is never noisy
+
+
+def _read(path: str) -> str | None:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _read_stat(path: str, key: str) -> int | None:
+    content = _read(path)
+    if content is None:
+        return None
+    for line in content.splitlines():
+        name, _, value = line.partition(' ')
+        if name == key:
+            return int(value)
+    return None
+
+
+class CgroupStats:
+    """
+    CPU and memory usage and limits of the cgroup the agent runs in, for the unified (v2) and the legacy (v1)
+    hierarchy. Without a readable cgroup, usage is that of the agent's own processes and there are no limits.
+    """
+
+    def __init__(self, root: str = CGROUP_ROOT):
+        self.version = None
+        self.cpu_dir = None  # Limits
+        self.cpuacct_dir = None  # Usage, a separate hierarchy on some v1 hosts
+        self.memory_dir = None
+
+        paths = {}  # controller -> path of our cgroup
+        for line in (_read("/proc/self/cgroup") or "").splitlines():
+            _, controllers, path = line.split(':', 2)
+            for controller in controllers.split(',') if controllers else [""]:
+                paths[controller] = path
+
+        if os.path.exists(os.path.join(root, "cgroup.controllers")):
+            self.version = 2
+            self.cpu_dir = self.cpuacct_dir = self.memory_dir = self._resolve(root, paths.get("", "/"))
+        elif os.path.isdir(os.path.join(root, "memory")):
+            self.version = 1
+            self.cpu_dir = self._resolve(self._mount(root, "cpu"), paths.get("cpu", "/"))
+            self.cpuacct_dir = self._resolve(self._mount(root, "cpuacct"), paths.get("cpuacct", "/"))
+            self.memory_dir = self._resolve(os.path.join(root, "memory"), paths.get("memory", "/"))
+
+    @staticmethod
+    def _mount(root: str, controller: str) -> str:
+        # cpu and cpuacct are usually co-mounted, with symlinks named after each of them
+        mount = os.path.join(root, controller)
+        return mount if os.path.isdir(mount) else os.path.join(root, "cpu,cpuacct")
+
+    @staticmethod
+    def _resolve(mount: str, path: str) -> str:
+        # Inside a container the cgroup is usually mounted as the root of the hierarchy
+        nested = os.path.join(mount, path.lstrip('/'))
+        return nested if os.path.isdir(nested) else mount
+
+    def cpu_seconds(self) -> float:
+        """
+        :return: CPU time consumed so far
+        """
+        if self.version == 2:
+            usage = _read_stat(os.path.join(self.cpu_dir, "cpu.stat"), "usage_usec")
+            if usage is not None:
+                return usage / 10**6
+        elif self.version == 1:
+            usage = _read(os.path.join(self.cpuacct_dir, "cpuacct.usage"))
+            if usage is not None:
+                return int(usage) / 10**9
+        return sum(os.times()[:4])
+
+    def memory_bytes(self) -> int:
+        """
+        :return: Working set, i.e. memory usage without reclaimable page cache (such as the spool's)
+        """
+        if self.version == 2:
+            usage = _read(os.path.join(self.memory_dir, "memory.current"))
+            if usage is not None:
+                inactive = _read_stat(os.path.join(self.memory_dir, "memory.stat"), "inactive_file") or 0
+                return max(0, int(usage) - inactive)
+        elif self.version == 1:
+            usage = _read(os.path.join(self.memory_dir, "memory.usage_in_bytes"))
+            if usage is not None:
+                inactive = _read_stat(os.path.join(self.memory_dir, "memory.stat"), "total_inactive_file") or 0
+                return max(0, int(usage) - inactive)
+        for line in (_read("/proc/self/status") or "").splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+        return 0
+
+    def cpu_limit(self) -> float | None:
+        """
+        :return: CPU limit in cores, None if unlimited
+        """
+        if self.version == 2:
+            quota, _, period = (_read(os.path.join(self.cpu_dir, "cpu.max")) or "max").partition(' ')
+            if quota != "max" and period:
+                return int(quota) / int(period)
+        elif self.version == 1:
+            quota = _read(os.path.join(self.cpu_dir, "cpu.cfs_quota_us"))
+            period = _read(os.path.join(self.cpu_dir, "cpu.cfs_period_us"))
+            if quota and period and int(quota) > 0:
+                return int(quota) / int(period)
+        return None
+
+    def memory_limit(self) -> int | None:
+        """
+        :return: Memory limit in bytes, None if unlimited
+        """
+        if self.version == 2:
+            limit = _read(os.path.join(self.memory_dir, "memory.max"))
+            if limit and limit != "max":
+                return int(limit)
+        elif self.version == 1:
+            limit = _read(os.path.join(self.memory_dir, "memory.limit_in_bytes"))
+            # Unlimited is reported as a huge page-aligned number
+            if limit and int(limit) < 2**60:
+                return int(limit)
+        return None
+
+
+class ResourceGovernor:
+    """
+    Keeps the agent within a CPU and memory budget by degrading ingestion step by step (see the levels above),
+    and restoring full fidelity step by step once usage falls.
+
+    Every tick, usage is compared with the budget. The level is raised after `ESCALATE_TICKS` consecutive ticks
+    over `HIGH_WATERMARK` and lowered after `RECOVER_TICKS` ticks under `LOW_WATERMARK`, so short spikes and
+    the effect of the previous step do not make it flap. Registered pipelines are then switched into the mode
+    of their container: noisy containers are picked by their line rate, containers with a `clogs.weight`
+    above 1 are never sampled or summarized, and those with a weight below 1 are paused when shedding.
+
+    A governor without budget only applies levels set through `set_level`. Worker processes run such a
+    governor and follow the level of the parent, which measures the whole cgroup including the workers.
+    """
+
+    def __init__(self, cpu_budget: float | None = None, memory_budget: int | None = None,
+                 stats: CgroupStats | None = None, interval: float = 2.0):
+        """
+        :param cpu_budget: CPU budget in cores
+        :param memory_budget: Memory budget in bytes
+        :param stats: Source of the usage, required with a budget
+        :param interval: Seconds between ticks
+        """
+        self.cpu_budget = cpu_budget
+        self.memory_budget = memory_budget
+        self.stats = stats if cpu_budget or memory_budget else None
+        self.interval = interval
+        self.level = NORMAL
+        self.memory_bound = False  # Whether memory was the scarcer resource at the last tick
+        self.listeners: list[Callable[[int], None]] = []  # Called with the new level on every change
+        self.lock = threading.Lock()
+        self.pipelines: dict[str, tuple[ContainerPipeline, float]] = {}  # container id -> (pipeline, weight)
+        self.seen: dict[str, int] = {}  # container id -> lines seen by its pipeline at the last tick
+        self.hot_ticks = 0
+        self.cool_ticks = 0
+        self.last_tick = time.monotonic()
+        self.last_cpu = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def interval_factor(self) -> int:
+        """
+        Factor for flush intervals and upload batch sizes.
+        """
+        return INTERVAL_FACTORS[self.level]
+
+    def register(self, pipeline: ContainerPipeline, weight: float = 1.0):
+        with self.lock:
+            self.pipelines[pipeline.container_id] = (pipeline, weight)
+        pipeline.set_mode(self._mode(pipeline.container_id, weight, set()))
+
+    def unregister(self, container_id: str):
+        with self.lock:
+            entry = self.pipelines.pop(container_id, None)
+        if entry:
+            # Release a paused reader, so it notices that it was stopped
+            entry[0].set_mode(FULL)
+
+    def start(self):
+        if self.stats:
+            budgets = []
+            if self.cpu_budget:
+                budgets.append(f"{self.cpu_budget:g} CPUs")
+            if self.memory_budget:
+                budgets.append(f"{self.memory_budget / 2**20:.0f} MiB")
+            logger.info(f"Resource governor keeping the agent within {' and '.join(budgets)}")
+        self.thread = threading.Thread(target=self._loop, name="governor", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    def _loop(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Error in resource governor: {e}")
+
+    def tick(self):
+        now = time.monotonic()
+        elapsed = max(now - self.last_tick, 1e-3)
+        self.last_tick = now
+        if self.stats:
+            self._measure(elapsed)
+        self._apply(elapsed)
+
+    def set_level(self, level: int, reason: str | None = None):
+        if level == self.level:
+            return
+        previous, self.level = self.level, level
+        if reason:
+            if level > previous:
+                logger.warning(f"Resource governor: {reason}, degrading to {LEVELS[level]}")
+            else:
+                logger.info(f"Resource governor: {reason}, restoring to {LEVELS[level]}")
+        metrics.set("clogs_governor_level", level)
+        metrics.inc("clogs_governor_transitions_total", direction="up" if level > previous else "down")
+        for listener in self.listeners:
+            listener(level)
+
+    def _measure(self, elapsed: float):
+        cpu = self.stats.cpu_seconds()
+        cores = (cpu - self.last_cpu) / elapsed if self.last_cpu is not None else 0.0
+        self.last_cpu = cpu
+        memory = self.stats.memory_bytes()
+        metrics.set("clogs_governor_cpu_cores", cores)
+        metrics.set("clogs_governor_memory_bytes", memory)
+
+        pressures = {}
+        if self.cpu_budget:
+            pressures["cpu"] = cores / self.cpu_budget
+        if self.memory_budget:
+            pressures["memory"] = memory / self.memory_budget
+        for resource, pressure in pressures.items():
+            metrics.set("clogs_governor_pressure", pressure, resource=resource)
+        resource, pressure = max(pressures.items(), key=lambda item: item[1])
+        self.memory_bound = resource == "memory"
+
+        if pressure >= HIGH_WATERMARK:
+            self.hot_ticks += 1
+            self.cool_ticks = 0
+        elif pressure < LOW_WATERMARK:
+            self.cool_ticks += 1
+            self.hot_ticks = 0
+        else:
+            self.hot_ticks = self.cool_ticks = 0
+
+        if self.hot_ticks >= ESCALATE_TICKS and self.level < SHEDDING:
+            self.hot_ticks = 0
+            self.set_level(self.level + 1, f"{resource} at {pressure:.0%} of budget")
+        elif self.cool_ticks >= RECOVER_TICKS and self.level > NORMAL:
+            self.cool_ticks = 0
+            self.set_level(self.level - 1, f"{resource} at {pressure:.0%} of budget")
+
+    def _apply(self, elapsed: float):
+        with self.lock:
+            pipelines = list(self.pipelines.items())
+
+        rates = {}
+        seen = {}
+        for container_id, (pipeline, _) in pipelines:
+            seen[container_id] = pipeline.seen
+            rates[container_id] = (pipeline.seen - self.seen.get(container_id, pipeline.seen)) / elapsed
+        self.seen = seen
+
+        noisy = self._noisy(rates) if self.level >= SAMPLING else set()
+        modes = {mode: 0 for mode in (FULL, SAMPLED, SUMMARY, PAUSED)}
+        for container_id, (pipeline, weight) in pipelines:
+            mode = self._mode(container_id, weight, noisy)
+            modes[mode] += 1
+            if pipeline.mode != mode:
+                logger.info(f"Resource governor: {pipeline.name} {pipeline.mode} -> {mode} ({rates[container_id]:.0f} lines/s)")
+                pipeline.set_mode(mode)
+        for mode, count in modes.items():
+            metrics.set("clogs_governor_containers", count, mode=mode)
+
+    def _mode(self, container_id: str, weight: float, noisy: set[str]) -> str:
+        if self.level >= SHEDDING and weight < 1:
+            return PAUSED
+        if container_id in noisy and weight <= 1:
+            return SUMMARY if self.level >= SHEDDING else SAMPLED
+        return FULL
+
+    @staticmethod
+    def _noisy(rates: dict[str, float]) -> set[str]:
+        total = sum(rates.values())
+        noisy = set()
+        covered = 0.0
+        for container_id, rate in sorted(rates.items(), key=lambda item: item[1], reverse=True):
+            if covered >= NOISY_SHARE * total or rate < NOISY_MIN_RATE:
+                break
+            noisy.add(container_id)
+            covered += rate
+        return noisy
+
+
+def create_governor(follower: bool = False) -> ResourceGovernor:
+    """
+    Creates the governor from `CLOGS_AGENT_CPU_BUDGET`/`CLOGS_AGENT_MEMORY_BUDGET`, defaulting to the limits
+    of the agent's cgroup.
+    :param follower: Create a governor without budget, which follows the level of another process
+    """
+    if follower:
+        return ResourceGovernor(interval=Config.GOVERNOR_INTERVAL)
+    stats = CgroupStats()
+    cpu_budget = Config.CPU_BUDGET or stats.cpu_limit()
+    memory_budget = int(Config.MEMORY_BUDGET * 2**20) or stats.memory_limit()
+    if not cpu_budget and not memory_budget:
+        logger.info("No CPU or memory limit or budget, the resource governor is inactive")
+    return ResourceGovernor(cpu_budget, memory_budget, stats, Config.GOVERNOR_INTERVAL)
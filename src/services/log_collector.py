@@ -1,84 +1,270 @@
 import threading
 import time
-import sqlite3
 import logging
 import json
 import os
-from docker.models.containers import Container
+import sqlite3
+from typing import Iterable, Sequence
 from src.api import APIClient
-from src.model.api import Log, MultiContainerLogTransfer, MultilineLogTransfer
+from src.model.api import Log, LogSummaryTransfer, MultiContainerLogTransfer, MultilineLogTransfer
+from src.model.model import ContainerRecord
 from src.config import Config
+from src.docker_api import STREAM, get_client
+from src.services.aggregation import LogAggregator
+from src.services.batching import RATE_SMOOTHING, AdaptiveBatching
+from src.services.buffer import TieredBuffer
+from src.services.file_tailer import Inotify, JsonFileTailer, get_json_log_path
+from src.services.governor import create_governor
+from src.services.log_parser import parse_docker_timestamp
+from src.services.pipeline import ContainerPipeline
+from src.services.spool import LogSpool
+from src.services.scheduling import DeficitRoundRobin
+from src.services.watchdog import watchdog
+from src.services.worker_pool import WorkerPool
 
 logger = logging.getLogger(__name__)
 
+# Container label controlling the share of upload bandwidth
+WEIGHT_LABEL = "clogs.weight"
+
+# Readers that end while their container keeps running are restarted after this delay, doubling up to the
+# maximum while they keep ending right away
+RESTART_DELAY = 1
+RESTART_DELAY_MAX = 60
+COMMIT_RETRY_DELAY = 0.5  # Seconds before the first retry of a failed spool write, doubling up to RESTART_DELAY_MAX
+
+# Stream positions share the checkpoint table with json-file offsets: inode 0, and the Docker timestamp (ns)
+# of the last committed line as the offset
+STREAM_INODE = 0
+
+
 class LogCollector:
-    def __init__(self, api_client: APIClient, agent_id: str):
+    def __init__(self, api_client: APIClient, agent_id: str, ingest_only: bool = False):
+        """
+        :param api_client: API client used by the sender and for summaries
+        :param agent_id: ID of the agent
+        :param ingest_only: Only run stream readers and write to the spool, without a sender.
+                            Used by worker processes, whose rows are sent by the parent.
+        """
         self.api_client = api_client
         self.agent_id = agent_id
+        self.ingest_only = ingest_only
         self.threads = {}
         self.stop_events = {}
+        self.streams = {}  # container id -> open log stream, closed on stop so its connection is released
+        self.monitored: dict[str | None, dict[str, ContainerRecord]] = {}  # endpoint -> container id -> container
+        self.positions: dict[str, int] = {}  # container id -> Docker timestamp of the last line committed by its stream
         self.running = False
         self.sender_thread = None
+        self.summary_thread = None
+        self.supervisor_thread = None
         self.lock = threading.Lock()
+
+        # Per-container level counts and top messages, shipped as summaries
+        self.aggregator = LogAggregator(Config.SUMMARY_BUCKET_SECONDS, Config.SUMMARY_TOP_K)
+        self.pending_summaries = []
+
+        # Fair batching across containers in the sender
+        self.weights: dict[str, float] = {}
+        self.scheduler = DeficitRoundRobin(Config.FAIR_QUANTUM, lambda container_id: self.weights.get(container_id, 1.0))
         
         # Initialize SQLite for persistent queuing
-        self.db_path = os.path.join(os.path.dirname(Config.AGENT_ID_FILE), 'logs.db')
-        self._init_db()
-
-    def _init_db(self):
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        with sqlite3.connect(self.db_path) as conn:
-            # Enable WAL mode for better concurrency
-            conn.execute('PRAGMA journal_mode=WAL')
-            # Set a busy timeout (5 seconds) to wait for locks to clear
-            conn.execute('PRAGMA busy_timeout=5000')
-            
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS pending_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    container_id TEXT,
-                    timestamp INTEGER,
-                    level TEXT,
-                    message TEXT
-                )
-            ''')
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_pending_logs_container_id ON pending_logs(container_id)')
+        self.spool = LogSpool(os.path.join(os.path.dirname(Config.AGENT_ID_FILE), 'logs.db'))
+        # Historical rows queued by `main.py backfill`, sent when live rows leave room in a batch
+        self.backfill_spool = LogSpool(self.spool.db_path, table="backfill_logs")
+        self.backfill_scheduler = DeficitRoundRobin(Config.FAIR_QUANTUM)
+
+        # Optionally shard stream readers/parsers across worker processes
+        self.worker_pool = None
+        if Config.WORKER_PROCESSES > 0 and not ingest_only:
+            self.worker_pool = WorkerPool(agent_id, Config.WORKER_PROCESSES, Config.WORKER_SHARDING)
+
+        # Rows are uploaded from memory while the backend keeps up. Worker processes always write to the spool,
+        # since their rows are sent by the parent.
+        persist = Config.ALWAYS_PERSIST or ingest_only or self.worker_pool is not None
+        self.buffer = TieredBuffer(self.spool, Config.MEMORY_BUFFER_SIZE, persist)
+
+        # Degrades ingestion when the agent nears its CPU or memory budget. Worker processes follow the parent's level.
+        self.governor = create_governor(follower=ingest_only)
+        self.governor.listeners.append(self._on_governor_level)
+
+        # Upload batch size and flush timing, adapted to the backend's latency and the ingest rate
+        self.batching = AdaptiveBatching.from_config()
+        if self.worker_pool:
+            # Workers have no sender to adapt their flush interval, they follow the parent's
+            self.batching.listeners.append(self.worker_pool.set_flush_interval)
+
+        # Readers that ended on their own: container id -> (container, earliest restart, Docker timestamp (ns) the
+        # restarted reader continues after unless a line was committed), and the restart delays
+        self.ended: dict[str, tuple[ContainerRecord, float, int]] = {}
+        self.restart_delays: dict[str, float] = {}
+
+        # Liveness for the watchdog
+        self.committing: dict[int, float] = {}  # thread id -> start of its commit in progress
+        self.sending = False  # The sender is in a cycle, not sleeping
 
     def start(self):
         self.running = True
+        if Config.GOVERNOR:
+            self.governor.start()
+        if self.worker_pool:
+            self.worker_pool.start()
+        else:
+            # With a worker pool the workers aggregate their own containers
+            self.summary_thread = threading.Thread(target=self._summary_loop, daemon=True)
+            self.summary_thread.start()
+        self.supervisor_thread = threading.Thread(target=self._supervisor_loop, name="reader-supervisor", daemon=True)
+        self.supervisor_thread.start()
+        if self.ingest_only:
+            return
         self.sender_thread = threading.Thread(target=self._log_sender_loop)
         self.sender_thread.daemon = True
         self.sender_thread.start()
+        # Readers only commit when lines arrive, so ingestion is stalled while a commit hangs, or a reader is dead
+        # and not restarted, however many other readers commit. Failed uploads are retried from the spool, so the
+        # sender is only stalled while a cycle hangs or it stopped looping.
+        watchdog.register("ingest", Config.STALL_TIMEOUT, waiting=self.ingest_waiting)
+        watchdog.register("uploads", Config.STALL_TIMEOUT, lambda: self.sending or not self.sender_thread.is_alive())
 
     def stop(self):
+        self.governor.stop()
         with self.lock:
             self.running = False
             for stop_event in self.stop_events.values():
                 stop_event.set()
+            for container_id in list(self.streams):
+                self._close_stream(container_id)
+        if self.worker_pool:
+            self.worker_pool.stop()
         if self.sender_thread:
             self.sender_thread.join()
+        # Rows still in memory are kept on disk for the next run
+        self.buffer.close()
+        self.spool.close()
+        if self.summary_thread:
+            self.summary_thread.join()
+        if self.supervisor_thread:
+            self.supervisor_thread.join()
         logger.info("LogCollector stopped.")
 
-    def update_monitored_containers(self, containers: list[Container]):
+    def update_monitored_containers(self, containers: list[ContainerRecord], endpoint: str | None = None,
+                                    resume: Iterable[str] = ()):
+        """
+        :param containers: Containers to collect logs from
+        :param endpoint: Docker endpoint the containers belong to. Only containers of that endpoint are replaced,
+                         those of other endpoints keep being collected. If None, the list replaces all containers.
+        :param resume: IDs of containers whose stream continues at its last committed line instead of only reading
+                       new lines, e.g. after it was moved from another worker process
+        """
         with self.lock:
             if not self.running:
                 return
-            current_ids = set(self.threads.keys())
-            new_ids = set(c.id for c in containers)
+            if endpoint is None:
+                previous = {cid: c for endpoint_containers in self.monitored.values() for cid, c in endpoint_containers.items()}
+                # Containers that stay keep their records, which their readers hold
+                self.monitored.clear()
+                self.monitored[None] = dict(previous)
+            else:
+                previous = self.monitored.get(endpoint, {})
+            current = {c.id: c for c in containers}
+            # Containers that stay may have changed their status, which matters where the records are copies
+            # (in worker processes) rather than the discovery's own records
+            self._apply([c for cid, c in current.items() if cid not in previous],
+                        [cid for cid in previous if cid not in current], endpoint, resume,
+                        [c for cid, c in current.items() if cid in previous])
 
-            # Stop monitoring removed containers
-            for container_id in current_ids - new_ids:
+    def update_containers(self, added: list[ContainerRecord], removed: list[str], endpoint: str | None = None,
+                          changed: Sequence[ContainerRecord] = ()):
+        """
+        Applies changes to the monitored containers of an endpoint, so a discovery cycle costs O(changes).
+        :param added: Containers to start collecting logs from
+        :param removed: IDs of containers to stop collecting logs from
+        :param endpoint: Docker endpoint the containers belong to
+        :param changed: Monitored containers whose status changed, e.g. to restart their readers once they run
+        """
+        with self.lock:
+            if not self.running:
+                return
+            self._apply(added, removed, endpoint, changed=changed)
+
+    def _apply(self, added: list[ContainerRecord], removed: list[str], endpoint: str | None, resume: Iterable[str] = (),
+               changed: Sequence[ContainerRecord] = ()):
+        monitored = self.monitored.setdefault(endpoint, {})
+        for container in changed:
+            record = monitored.get(container.id)
+            if record is not None and record is not container:
+                # Readers that ended hold this record, the supervisor restarts them once it is running
+                record.status = container.status
+        for container_id in removed:
+            monitored.pop(container_id, None)
+            self.weights.pop(container_id, None)
+            self.positions.pop(container_id, None)
+            if not self.worker_pool:
                 self._stop_collecting(container_id)
+        for container in added:
+            monitored[container.id] = container
+            self.weights[container.id] = self._label_weight(container)
+            if not self.worker_pool and container.id not in self.threads:
+                self._start_collecting(container, container.id in resume)
 
-            # Start monitoring new containers
-            for container in containers:
-                if container.id not in self.threads:
-                    self._start_collecting(container)
+        # A restarted worker needs its whole assignment again, and workers hold copies of the records
+        if self.worker_pool and (self.worker_pool.check_workers() or added or removed or changed):
+            self.worker_pool.update_monitored_containers(
+                [c for endpoint_containers in self.monitored.values() for c in endpoint_containers.values()])
 
-    def _start_collecting(self, container: Container):
+    def _commit(self, rows: list[tuple], checkpoint: tuple[str, int, int] | None = None):
+        """
+        Writes rows with their checkpoint. The spool is shared with the sender and other worker processes, so a
+        write that fails once its busy timeout passed ("database is locked") or for lack of disk space is retried
+        with backoff: the reader waits instead of losing the rows, and the watchdog reports it if it waits too long.
+        :raise sqlite3.Error: If the write failed and the agent is stopping, or the error is not transient
+        """
+        thread_id = threading.get_ident()
+        self.committing[thread_id] = time.monotonic()
+        delay = COMMIT_RETRY_DELAY
+        try:
+            while True:
+                try:
+                    self.buffer.insert(rows, checkpoint)
+                    return
+                except sqlite3.OperationalError as e:
+                    if not self.running:
+                        raise
+                    logger.warning(f"Writing {len(rows)} rows to the log spool failed, retrying in {delay:g}s: {e}")
+                    time.sleep(delay)
+                    delay = min(delay * 2, RESTART_DELAY_MAX)
+        finally:
+            del self.committing[thread_id]
+
+    def _is_monitored(self, container_id: str) -> bool:
+        return any(container_id in containers for containers in list(self.monitored.values()))
+
+    def _on_governor_level(self, level: int):
+        # Rows spill to disk earlier while memory is the scarce resource
+        factor = self.governor.interval_factor if self.governor.memory_bound else 1
+        self.buffer.capacity = Config.MEMORY_BUFFER_SIZE // factor
+        if self.worker_pool:
+            self.worker_pool.set_governor_level(level)
+
+    @staticmethod
+    def _label_weight(container: ContainerRecord) -> float:
+        try:
+            weight = float((container.labels or {}).get(WEIGHT_LABEL, 1.0))
+        except ValueError:
+            logger.warning(f"Invalid {WEIGHT_LABEL} label on {container.name}, using 1")
+            return 1.0
+        return weight if weight > 0 else 1.0
+
+    def _start_collecting(self, container: ContainerRecord, resume: bool = False, since: int | None = None):
+        """
+        :param resume: Continue the stream at its last committed line instead of only reading new lines
+        :param since: Docker timestamp (ns) to continue after if no line of the stream was committed yet
+        """
         logger.info(f"Starting log collection for container {container.name} ({container.id[:12]})")
         stop_event = threading.Event()
-        t = threading.Thread(target=self._stream_logs, args=(container, stop_event))
+        pipeline = ContainerPipeline(container, self.aggregator)
+        self.governor.register(pipeline, self.weights.get(container.id, 1.0))
+        t = threading.Thread(target=self._collect, args=(container, pipeline, stop_event, resume, since))
         t.daemon = True
         t.start()
         self.threads[container.id] = t
@@ -90,142 +276,364 @@ class LogCollector:
             self.stop_events[container_id].set()
             del self.stop_events[container_id]
             del self.threads[container_id]
+        self.ended.pop(container_id, None)
+        self.restart_delays.pop(container_id, None)
+        self.governor.unregister(container_id)
+        self._close_stream(container_id)
+
+    def _supervisor_loop(self):
+        while self.running:
+            try:
+                with self.lock:
+                    if self.running:
+                        self._restart_readers()
+            except Exception as e:
+                logger.error(f"Error in reader supervisor: {e}")
+            time.sleep(1)
+
+    def _restart_readers(self):
+        """
+        Restarts readers that ended while their container is running, e.g. after the container restarted or the
+        daemon dropped the stream. They continue at their last committed line. Must hold the lock.
+        """
+        now = time.monotonic()
+        for container_id, (container, due, since) in list(self.ended.items()):
+            # Stopped containers have nothing to read until they start again. Statuses are kept up to date by
+            # discovery, in worker processes by the parent's assignments.
+            if container.status != "running" or now < due:
+                continue
+            del self.ended[container_id]
+            logger.info(f"Log reader of {container.name} ({container_id[:12]}) ended, restarting it")
+            self._start_collecting(container, resume=True, since=since)
+
+    def ingest_waiting(self) -> float | None:
+        """
+        Ingestion is held up by commits that do not complete, readers that ended and were not restarted when due,
+        and with a worker pool by workers that are stuck or stopped reporting.
+        :return: Monotonic time since which the oldest of these waits, None if none does
+        """
+        now = time.monotonic()
+        waiting = list(self.committing.values())
+        with self.lock:
+            waiting.extend(due for container, due, _ in self.ended.values() if container.status == "running" and due < now)
+        if self.worker_pool:
+            worker_waiting = self.worker_pool.ingest_waiting()
+            if worker_waiting is not None:
+                waiting.append(worker_waiting)
+        return min(waiting, default=None)
+
+    def _close_stream(self, container_id: str):
+        # A stream blocked on a quiet container only notices the stop event with its next line
+        stream = self.streams.pop(container_id, None)
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception as e:
+                logger.debug(f"Failed to close log stream of {container_id[:12]}: {e}")
+
+    def _collect(self, container: ContainerRecord, pipeline: ContainerPipeline, stop_event: threading.Event, resume: bool,
+                 since: int | None = None):
+        started = time.monotonic()
+        # Where a restart continues if this reader commits no line: lines it read but did not commit, and those
+        # written until the restart, are read again. Compared with the daemon's clock, which should be in sync.
+        start_position = time.time_ns()
+        try:
+            # The log file is resolved here rather than under the lock: its inspect call may wait for a slow daemon,
+            # which would hold up the containers of every other endpoint.
+            log_path = get_json_log_path(container) if Config.COLLECTION_MODE == "file" else None
+            if stop_event.is_set():
+                return
+            if log_path:
+                # Tailing always resumes at its checkpoint
+                self._tail_logs(container, log_path, pipeline, stop_event)
+                return
+            if resume:
+                position = self.positions.get(container.id)
+                checkpoint = self.spool.get_checkpoint(container.id)
+                if position is None and checkpoint and checkpoint[0] == STREAM_INODE:
+                    position = checkpoint[1]
+                since = position if position is not None else since
+            else:
+                since = None
+            if since is not None:
+                start_position = since
+            self._stream_logs(container, pipeline, stop_event, since)
+        finally:
+            with self.lock:
+                if not stop_event.is_set():
+                    # Ended on its own, the supervisor restarts it. Readers that keep ending right away back off.
+                    delay = self.restart_delays.get(container.id, RESTART_DELAY / 2) * 2
+                    if time.monotonic() - started > RESTART_DELAY_MAX:
+                        delay = RESTART_DELAY
+                    self.restart_delays[container.id] = min(delay, RESTART_DELAY_MAX)
+                    self.ended[container.id] = (container, time.monotonic() + self.restart_delays[container.id], start_position)
 
-    def _stream_logs(self, container: Container, stop_event: threading.Event):
+    def _stream_logs(self, container: ContainerRecord, pipeline: ContainerPipeline, stop_event: threading.Event,
+                     since: int | None = None):
+        """
+        :param since: Docker timestamp (ns) of the last line already committed, to continue after it.
+                      If None, only new lines are read.
+        """
         try:
             # tail='0' to only get new logs, follow=True to stream
             # timestamps=True to get timestamp from docker
-            logs = container.logs(stream=True, follow=True, tail=0, timestamps=True)
-            
-            # Open its own connection for this thread
-            conn = sqlite3.connect(self.db_path)
-            
-            from datetime import datetime
-            
+            position = {'tail': 0} if since is None else {'tail': 'all', 'since': since / 10**9}
+            logs = get_client(container.endpoint, STREAM).api.logs(container.id, stream=True, follow=True, timestamps=True, **position)
+            with self.lock:
+                if stop_event.is_set():
+                    logs.close()
+                    return
+                self.streams[container.id] = logs
+
             buffer = []
             last_flush = time.time()
-            
+            rate = 0.0  # Moving average of lines read per second
+            read = 0
+            last_timestamp = None  # Of the last line read since the last flush
+
             for line in logs:
                 if stop_event.is_set():
                     break
+                read += 1
 
                 try:
                     line_str = line.decode('utf-8')
                     # Docker log format with timestamps: "2023-10-27T10:00:00.000000000Z log message"
                     parts = line_str.split(' ', 1)
-                    if len(parts) == 2:
-                        timestamp_str, log_content = parts
-                        
-                        try:
-                            # Handle Docker RFC3339 timestamps (e.g., 2023-10-27T10:00:00.000000000Z)
-                            # Python's fromisoformat is faster but may need minor tweaking for nanoseconds/Z
-                            ts_fixed = timestamp_str.replace('Z', '+00:00')
-                            # Docker often provides more than 6 digits for microseconds, truncate to 6
-                            if '.' in ts_fixed:
-                                base, rest = ts_fixed.split('.', 1)
-                                micros = rest[:6]
-                                offset = rest[rest.find('+'):] if '+' in rest else rest[rest.find('-'):] if '-' in rest else ''
-                                ts_fixed = f"{base}.{micros}{offset}"
-                            
-                            dt = datetime.fromisoformat(ts_fixed)
-                            ts_ns = int(dt.timestamp() * 10**9)
-                        except Exception as te:
-                            logger.debug(f"Failed to parse docker timestamp '{timestamp_str}', using fallback: {te}")
-                            ts_ns = time.time_ns()
-
-                        # Basic log level detection
-                        level = "INFO"
-                        lower_msg = log_content.lower()
-                        if any(k in lower_msg for k in ["error", "crit", "fatal", "fail"]):
-                            level = "ERROR"
-                        elif any(k in lower_msg for k in ["warn", "warning"]):
-                            level = "WARNING"
-                        elif "debug" in lower_msg:
-                            level = "DEBUG"
-
-                        buffer.append((container.id, ts_ns, level, log_content.strip()))
-                        
-                        # Flush if buffer is large or time has passed
-                        if len(buffer) >= 50 or (time.time() - last_flush > 1.0):
-                            conn.executemany(
-                                'INSERT INTO pending_logs (container_id, timestamp, level, message) VALUES (?, ?, ?, ?)',
-                                buffer
-                            )
-                            conn.commit()
-                            buffer = []
-                            last_flush = time.time()
+                    if len(parts) != 2:
+                        continue
+                    timestamp_str, log_content = parts
+                    if since is not None:
+                        # `since` has a precision of seconds, lines up to the committed one are skipped
+                        if parse_docker_timestamp(timestamp_str) <= since:
+                            continue
+                        since = None
+                    last_timestamp = timestamp_str
+                    row = pipeline.process(timestamp_str, log_content, stop_event)
+                    if row:
+                        buffer.append(row)
                 except Exception as e:
                     logger.error(f"Error parsing log line: {e}")
-            
-            if buffer:
-                conn.executemany(
-                    'INSERT INTO pending_logs (container_id, timestamp, level, message) VALUES (?, ?, ?, ?)',
-                    buffer
-                )
-                conn.commit()
-                
-            conn.close()
+                    continue
+
+                # Flush once the buffer holds a flush interval's worth of lines at this stream's rate,
+                # or the interval has passed. Both grow while the governor relaxes.
+                factor = self.governor.interval_factor
+                now = time.time()
+                if len(buffer) >= self.batching.flush_rows(rate, self.buffer.persist) * factor or now - last_flush > self.batching.flush_interval * factor:
+                    try:
+                        self._commit_stream(container.id, buffer, last_timestamp)
+                    except sqlite3.Error as e:
+                        # The rows stay buffered for the next flush, the stream position is not advanced
+                        logger.error(f"Failed to write {len(buffer)} logs of {container.name} to the spool: {e}")
+                        last_flush = now
+                        continue
+                    last_timestamp = None
+                    rate = RATE_SMOOTHING * read / max(now - last_flush, 1e-3) + (1 - RATE_SMOOTHING) * rate
+                    read = 0
+                    buffer = []
+                    last_flush = now
+                    pipeline.report()
+
+            try:
+                self._commit_stream(container.id, buffer, last_timestamp)
+            except sqlite3.Error as e:
+                # Not advancing the position, a resumed reader reads these lines again
+                logger.error(f"Failed to write {len(buffer)} logs of {container.name} to the spool: {e}")
+            pipeline.report()
 
         except Exception as e:
             # This happens when container dies or is stopped
             logger.debug(f"Stream ended for {container.name}: {e}")
         finally:
-            pass
+            with self.lock:
+                if not stop_event.is_set():
+                    self._close_stream(container.id)
+            self.spool.close()
+
+    def _commit_stream(self, container_id: str, rows: list[tuple], last_timestamp: str | None):
+        """
+        Commits rows of a stream together with its position, the timestamp of the last line read.
+        """
+        if last_timestamp is None:
+            return
+        try:
+            position = parse_docker_timestamp(last_timestamp)
+        except ValueError:
+            if rows:
+                self._commit(rows)
+            return
+        self._commit(rows, (container_id, STREAM_INODE, position))
+        self.positions[container_id] = position
+
+    def _tail_logs(self, container: ContainerRecord, log_path: str, pipeline: ContainerPipeline, stop_event: threading.Event):
+        """
+        Tails the container's json-file log directly instead of streaming through the daemon.
+        Rows and the byte-offset checkpoint are committed in the same transaction,
+        so a restart resumes exactly where the last commit left off.
+        """
+        tailer = None
+        notifier = None
+        try:
+            checkpoint = self.spool.get_checkpoint(container.id)
+            if checkpoint and checkpoint[0] == STREAM_INODE:
+                checkpoint = None  # Position of a stream, e.g. before the log file was mounted
+            tailer = JsonFileTailer(log_path, checkpoint)
+            notifier = Inotify.create(os.path.dirname(log_path))
+
+            while not stop_event.is_set():
+                lines = tailer.read_lines()
+                if not lines:
+                    if notifier:
+                        notifier.wait(1.0)
+                    else:
+                        stop_event.wait(0.25)
+                    continue
+
+                buffer = []
+                for line in lines:
+                    try:
+                        entry = json.loads(line)
+                        row = pipeline.process(entry['time'], entry['log'], stop_event)
+                        if row:
+                            buffer.append(row)
+                    except Exception as e:
+                        logger.error(f"Error parsing json log line: {e}")
+
+                self._commit(buffer, (container.id, tailer.inode, tailer.offset))
+                pipeline.report()
+        except Exception as e:
+            logger.error(f"Tailing {log_path} for {container.name} failed: {e}")
+        finally:
+            if notifier:
+                notifier.close()
+            if tailer:
+                tailer.close()
+            self.spool.close()
+
+    def _summary_loop(self):
+        """
+        Ships closed aggregation buckets. Failed uploads are retried, keeping at most
+        Config.SUMMARY_BACKLOG summaries (oldest are dropped first).
+        """
+        while True:
+            stopping = not self.running
+            self.pending_summaries.extend(self.aggregator.collect(flush=stopping))
+            if len(self.pending_summaries) > Config.SUMMARY_BACKLOG:
+                dropped = len(self.pending_summaries) - Config.SUMMARY_BACKLOG
+                logger.warning(f"Summary backlog is full, dropping {dropped} oldest summaries")
+                del self.pending_summaries[:dropped]
+
+            if self.pending_summaries:
+                transfer = LogSummaryTransfer(agent_id=self.agent_id, summaries=self.pending_summaries)
+                if self.api_client.upload_log_summaries(self.agent_id, transfer):
+                    self.pending_summaries = []
+
+            if stopping:
+                break
+            for _ in range(20):
+                if not self.running:
+                    break
+                time.sleep(.25)
 
     def _log_sender_loop(self):
         last_retention_cleanup = 0
+        last_maintenance = time.time()
         while self.running:
+            self.sending = True
             try:
-                # Batch logs from SQLite
-                with sqlite3.connect(self.db_path) as conn:
-                    # Periodically prune old logs (Retention: 7 days)
-                    current_time = time.time()
-                    if current_time - last_retention_cleanup > 3600: # Every hour
-                        retention_threshold = int((current_time - (7 * 24 * 3600)) * 10**9)
-                        conn.execute('DELETE FROM pending_logs WHERE timestamp < ?', (retention_threshold,))
-                        conn.commit()
-                        last_retention_cleanup = current_time
-
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT id, container_id, timestamp, level, message FROM pending_logs LIMIT 100')
-                    rows = cursor.fetchall()
-                    
-                    if not rows:
-                        time.sleep(1)
-                        continue
+                current_time = time.time()
+                # Periodically prune old logs (Retention: 7 days)
+                if current_time - last_retention_cleanup > 3600: # Every hour
+                    retention_threshold = int((current_time - (7 * 24 * 3600)) * 10**9)
+                    pruned = self.spool.prune(retention_threshold)
+                    if pruned:
+                        logger.warning(f"Dropped {pruned} logs older than the retention period")
+                    # Drop checkpoints of containers that are gone, stream positions are kept while containers are monitored
+                    self.spool.prune_checkpoints(lambda container_id: self._is_monitored(container_id) or os.path.isdir(os.path.join(Config.DOCKER_CONTAINERS_DIR, container_id)))
+                    last_retention_cleanup = current_time
 
-                    ids = [r[0] for r in rows]
-                    batch = [
-                        Log(container_id=r[1], timestamp=r[2], level=r[3], message=r[4])
-                        for r in rows
-                    ]
-
-                    # Group by container
-                    logs_by_container = {}
-                    for log in batch:
-                        if log.container_id not in logs_by_container:
-                            logs_by_container[log.container_id] = []
-                        logs_by_container[log.container_id].append(log)
-
-                    container_logs_list = []
-                    for container_id, logs in logs_by_container.items():
-                        container_logs_list.append(MultilineLogTransfer(
-                            container_id=container_id,
-                            logs=logs
-                        ))
-
-                    transfer = MultiContainerLogTransfer(
-                        agent_id=self.agent_id,
-                        container_logs=container_logs_list
+                # Fewer, larger uploads while the governor relaxes
+                factor = self.governor.interval_factor
+                batch_size = self.batching.batch_size * factor
+
+                # Deficit round-robin across containers, so a noisy container cannot fill every batch
+                rows = self.scheduler.select(
+                    self.buffer.next_container,
+                    lambda container_id, limit, last: self.buffer.fetch(container_id, limit, last[0] if last else 0),
+                    batch_size
+                )
+                backfill_rows = []
+                if len(rows) < batch_size:
+                    backfill_rows = self.backfill_scheduler.select(
+                        self.backfill_spool.next_container,
+                        lambda container_id, limit, last: self.backfill_spool.fetch(container_id, limit, last[0] if last else 0),
+                        batch_size - len(rows)
                     )
 
-                    if self.api_client.upload_logs(self.agent_id, transfer):
-                        # Delete sent logs
-                        conn.execute(f'DELETE FROM pending_logs WHERE id IN ({",".join(map(str, ids))})')
-                        conn.commit()
-                    else:
-                        logger.warning("Failed to send logs, will retry next interval")
-                        time.sleep(5) # Backoff
+                # Release free pages and checkpoint the WAL, more eagerly while idle
+                if current_time - last_maintenance > (60 if rows or backfill_rows else 10):
+                    self.spool.maintain(idle=not rows and not backfill_rows)
+                    last_maintenance = current_time
+
+                if not rows and not backfill_rows:
+                    self.sending = False
+                    watchdog.beat("uploads")
+                    self.batching.on_idle()
+                    time.sleep(self.batching.flush_interval * factor)
+                    continue
+
+                # Rows are grouped by container and ordered by id within each container
+                watermarks = {}
+                backfill_watermarks = {}
+                logs_by_container = {}
+                for r in rows:
+                    watermarks[r[1]] = r[0]
+                for r in backfill_rows:
+                    backfill_watermarks[r[1]] = r[0]
+                for r in backfill_rows + rows:
+                    if r[1] not in logs_by_container:
+                        logs_by_container[r[1]] = []
+                    logs_by_container[r[1]].append((r[2], r[3], r[4], json.loads(r[5]) if r[5] else None))
+
+                started = time.monotonic()
+                sent = None
+                if self.api_client.use_columnar():
+                    sent = self.api_client.upload_columnar_logs(self.agent_id, logs_by_container.items())
+                if sent is None:
+                    sent = self.api_client.upload_logs(self.agent_id, MultiContainerLogTransfer(
+                        agent_id=self.agent_id,
+                        container_logs=[
+                            MultilineLogTransfer(
+                                container_id=container_id,
+                                logs=[
+                                    Log(container_id=container_id, timestamp=ts, level=level, message=message, attributes=attributes)
+                                    for ts, level, message, attributes in logs
+                                ]
+                            )
+                            for container_id, logs in logs_by_container.items()
+                        ]
+                    ))
+
+                self.batching.on_upload(
+                    time.monotonic() - started, self.api_client.last_upload_status,
+                    len(rows) + len(backfill_rows) >= batch_size
+                )
+                # A failed attempt is progress too: rows stay in the spool until the backend is back
+                watchdog.beat("uploads")
+                if sent:
+                    # Delete sent logs
+                    self.buffer.ack(watermarks)
+                    if backfill_watermarks:
+                        self.backfill_spool.ack(backfill_watermarks)
+                else:
+                    logger.warning("Failed to send logs, will retry next interval")
+                    self.buffer.fail()
+                    self.sending = False
+                    time.sleep(self.batching.backoff)
             except Exception as e:
                 logger.error(f"Error in log sender loop: {e}")
+                self.sending = False
                 time.sleep(1)
+        self.spool.close()
+        self.backfill_spool.close()
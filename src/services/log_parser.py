@@ -0,0 +1,252 @@
+import json
+import logging
+import re
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+MAX_FIELDS = 16  # Attributes kept per line
+MAX_VALUE_LENGTH = 256  # Characters kept per attribute value
+MIN_TIMESTAMP_NS = 946684800 * 10**9  # 2000-01-01, earlier values are durations or counters rather than timestamps
+
+FORMATS = ("json", "logfmt", "access", "plain")
+
+_TIMESTAMP_KEYS = ("time", "timestamp", "ts", "@timestamp", "datetime")
+_LEVEL_KEYS = ("level", "lvl", "severity", "loglevel", "log.level")
+_MESSAGE_KEYS = ("msg", "message")
+
+_LEVELS = {
+    "error": "ERROR", "err": "ERROR", "fatal": "ERROR", "crit": "ERROR", "critical": "ERROR",
+    "panic": "ERROR", "alert": "ERROR", "emerg": "ERROR", "emergency": "ERROR",
+    "warn": "WARNING", "warning": "WARNING",
+    "info": "INFO", "information": "INFO", "notice": "INFO",
+    "debug": "DEBUG", "trace": "DEBUG",
+}
+
+_LOGFMT_PAIR = re.compile(r'([\w.\-/@]+)=("(?:[^"\\]|\\.)*"|\S*)')
+_ACCESS_LOG = re.compile(
+    r'^(?P<remote_addr>\S+) \S+ (?P<remote_user>\S+) \[(?P<time>[^\]]+)\] '
+    r'"(?P<method>[A-Z]+) (?P<path>\S+)(?: (?P<protocol>[^"]*))?" (?P<status>\d{3}) (?P<bytes>\S+)'
+    r'(?: "(?P<referer>[^"]*)" "(?P<user_agent>[^"]*)")?'
+)
+
+# (timestamp in ns or None, level or None, attributes or None)
+ParsedLine = tuple[int | None, str | None, dict[str, str] | None]
+
+
+def parse_docker_timestamp(timestamp_str: str) -> int:
+    """
+    Parses a Docker RFC3339Nano timestamp (e.g. 2023-10-27T10:00:00.000000000Z) into nanoseconds since epoch.
+    Also accepts ISO 8601 variants written by applications: a comma as fraction separator, and no offset,
+    which is read as UTC rather than the agent's local time.
+    :raise: ValueError: If the timestamp is malformed
+    """
+    ts_fixed = timestamp_str.replace('Z', '+00:00').replace(',', '.', 1)
+    fraction_ns = 0
+    # fromisoformat only handles microseconds, so split off the fraction and keep all 9 digits
+    if '.' in ts_fixed:
+        base, rest = ts_fixed.split('.', 1)
+        sign = max(rest.find('+'), rest.find('-'))
+        digits, offset = (rest[:sign], rest[sign:]) if sign >= 0 else (rest, '')
+        fraction_ns = int(digits[:9].ljust(9, '0'))
+        ts_fixed = f"{base}{offset}"
+    parsed = datetime.fromisoformat(ts_fixed)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp()) * 10**9 + fraction_ns
+
+
+def detect_level(message: str) -> str:
+    """
+    Basic keyword based log level detection.
+    """
+    lower_msg = message.lower()
+    if any(k in lower_msg for k in ["error", "crit", "fatal", "fail"]):
+        return "ERROR"
+    elif any(k in lower_msg for k in ["warn", "warning"]):
+        return "WARNING"
+    elif "debug" in lower_msg:
+        return "DEBUG"
+    return "INFO"
+
+
+def normalize_level(value) -> str | None:
+    """
+    Maps level names (and pino/bunyan style numeric levels) onto the agent's levels.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return "ERROR" if value >= 50 else "WARNING" if value >= 40 else "INFO" if value >= 30 else "DEBUG"
+    if isinstance(value, str):
+        return _LEVELS.get(value.strip().lower())
+    return None
+
+
+def parse_timestamp(value) -> int | None:
+    """
+    Parses ISO 8601 strings and epoch numbers (seconds, milliseconds, microseconds or nanoseconds).
+    :return: Nanoseconds since epoch, or None if the value is not a plausible timestamp (before 2000),
+             e.g. a duration in a field named `time`.
+    """
+    timestamp = None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        for scale in (10**9, 10**6, 10**3, 1):
+            if value * scale < 10**19:
+                timestamp = int(value * scale)
+                break
+    elif isinstance(value, str):
+        try:
+            timestamp = parse_docker_timestamp(value.replace(' ', 'T', 1))
+        except ValueError:
+            return None
+    if timestamp is None or timestamp < MIN_TIMESTAMP_NS:
+        return None
+    return timestamp
+
+
+def _timestamp_field(fields: dict) -> tuple[int | None, str | None]:
+    """
+    Fields named like timestamps that hold something else are left to the attributes.
+    :return: (timestamp in ns, key) of the first timestamp field that holds a timestamp, (None, None) if there is none
+    """
+    for key in _TIMESTAMP_KEYS:
+        if key in fields:
+            timestamp = parse_timestamp(fields[key])
+            if timestamp is not None:
+                return timestamp, key
+    return None, None
+
+
+def _bounded(fields: dict, skip: tuple) -> dict[str, str] | None:
+    attributes = {}
+    for key, value in fields.items():
+        if key in skip or isinstance(value, (dict, list)) or value is None:
+            continue
+        if len(attributes) >= MAX_FIELDS:
+            break
+        attributes[key] = str(value)[:MAX_VALUE_LENGTH]
+    return attributes or None
+
+
+def parse_json(line: str) -> ParsedLine | None:
+    if not line.startswith('{'):
+        return None
+    try:
+        fields = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(fields, dict):
+        return None
+
+    timestamp, timestamp_key = _timestamp_field(fields)
+    level = next((normalize_level(fields[k]) for k in _LEVEL_KEYS if k in fields), None)
+    return timestamp, level, _bounded(fields, (timestamp_key,) + _LEVEL_KEYS + _MESSAGE_KEYS)
+
+
+def parse_logfmt(line: str) -> ParsedLine | None:
+    pairs = _LOGFMT_PAIR.findall(line)
+    # Require a line that starts with a pair, so prose containing a single "a=b" is not mistaken for logfmt
+    if len(pairs) < 2 or not line.startswith(pairs[0][0] + '='):
+        return None
+
+    fields = {}
+    for key, value in pairs:
+        if value.startswith('"') and value.endswith('"') and len(value) >= 2:
+            value = value[1:-1].replace('\\"', '"')
+        fields[key] = value
+
+    timestamp, timestamp_key = _timestamp_field(fields)
+    level = next((normalize_level(fields[k]) for k in _LEVEL_KEYS if k in fields), None)
+    return timestamp, level, _bounded(fields, (timestamp_key,) + _LEVEL_KEYS + _MESSAGE_KEYS)
+
+
+def parse_access(line: str) -> ParsedLine | None:
+    match = _ACCESS_LOG.match(line)
+    if match is None:
+        return None
+    fields = match.groupdict()
+
+    try:
+        timestamp = int(datetime.strptime(fields['time'], "%d/%b/%Y:%H:%M:%S %z").timestamp()) * 10**9
+    except ValueError:
+        timestamp = None
+    status = int(fields['status'])
+    level = "ERROR" if status >= 500 else "WARNING" if status >= 400 else "INFO"
+    return timestamp, level, _bounded(fields, ("time",))
+
+
+_PARSERS = {"json": parse_json, "logfmt": parse_logfmt, "access": parse_access}
+
+
+class FormatDetector:
+    """
+    Detects the log format of one container from a sample of its lines and caches the decision.
+    While sampling, every candidate parser is tried. Afterwards only the detected parser runs, and lines it
+    cannot parse fall through as plain text. If the detected format stops matching, the container is re-sampled.
+    Containers detected as plain text are re-sampled every `PLAIN_RESAMPLE_LINES` lines or `PLAIN_RESAMPLE_SECONDS`,
+    since their first lines may have been a startup banner in front of structured output.
+    """
+
+    SAMPLE_SIZE = 20
+    MIN_MATCH_RATIO = 0.8
+    MAX_CONSECUTIVE_MISSES = 100
+    PLAIN_RESAMPLE_LINES = 1000
+    PLAIN_RESAMPLE_SECONDS = 300
+
+    def __init__(self, name: str, forced_format: str | None = None):
+        self.name = name
+        self.format = forced_format
+        self.forced = forced_format is not None
+        self.detected = None  # Last detected format
+        self.detected_at = 0.0
+        self.samples: dict[str, int] = {}
+        self.sampled = 0
+        self.misses = 0
+
+    def parse(self, line: str) -> ParsedLine | None:
+        if self.format is None:
+            return self._sample(line)
+        parser = _PARSERS.get(self.format)
+        if parser is None:
+            if not self.forced:
+                self.misses += 1
+                if self.misses >= self.PLAIN_RESAMPLE_LINES or time.monotonic() - self.detected_at >= self.PLAIN_RESAMPLE_SECONDS:
+                    self._resample()
+            return None
+
+        parsed = parser(line)
+        if parsed is not None:
+            self.misses = 0
+        elif not self.forced:
+            self.misses += 1
+            if self.misses >= self.MAX_CONSECUTIVE_MISSES:
+                logger.info(f"Log format of {self.name} no longer looks like {self.format}, detecting again")
+                self._resample()
+        return parsed
+
+    def _resample(self):
+        self.format = None
+        self.samples, self.sampled, self.misses = {}, 0, 0
+
+    def _sample(self, line: str) -> ParsedLine | None:
+        result = None
+        for name, parser in _PARSERS.items():
+            parsed = parser(line)
+            if parsed is not None:
+                self.samples[name] = self.samples.get(name, 0) + 1
+                if result is None:
+                    result = parsed
+
+        self.sampled += 1
+        if self.sampled >= self.SAMPLE_SIZE:
+            best = max(self.samples, key=self.samples.get, default=None)
+            if best is not None and self.samples[best] >= self.MIN_MATCH_RATIO * self.sampled:
+                self.format = best
+            else:
+                self.format = "plain"
+            # Plain containers are re-sampled periodically, which is only worth logging if the format changed
+            log = logger.info if self.format != self.detected else logger.debug
+            log(f"Detected log format of {self.name}: {self.format}")
+            self.detected = self.format
+            self.detected_at = time.monotonic()
+        return result
@@ -0,0 +1,130 @@
+import logging
+import threading
+from typing import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# (metric name, sorted (label, value) pairs)
+MetricKey = tuple[str, tuple[tuple[str, str], ...]]
+
+
+class Metrics:
+    """
+    Process-wide counters and gauges, rendered in the Prometheus text format.
+
+    Hot paths should count locally and publish deltas in batches (see `ContainerPipeline.report`) rather than
+    calling `inc` per line. Values that already exist elsewhere can be published by a collector, which runs
+    right before every snapshot or render. Snapshots of other processes (worker processes) are merged in with `merge`.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.collectors: list[Callable[["Metrics"], None]] = []
+        self.counters: dict[MetricKey, float] = {}
+        self.gauges: dict[MetricKey, float] = {}
+        self.remote: dict[str, tuple[dict[MetricKey, float], dict[MetricKey, float]]] = {}  # source -> snapshot
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    def add_collector(self, collector: Callable[["Metrics"], None]):
+        self.collectors.append(collector)
+
+    def _collect(self):
+        for collector in self.collectors:
+            try:
+                collector(self)
+            except Exception as e:
+                logger.debug(f"Metrics collector {collector.__name__} failed: {e}")
+
+    def snapshot(self) -> tuple[dict[MetricKey, float], dict[MetricKey, float]]:
+        """
+        :return: (counters, gauges) of this process, picklable
+        """
+        self._collect()
+        with self.lock:
+            return dict(self.counters), dict(self.gauges)
+
+    def merge(self, source: str, snapshot: tuple[dict[MetricKey, float], dict[MetricKey, float]]):
+        """
+        Replaces the snapshot of another process. Counters are summed with ours, gauges get a `source` label.
+        """
+        with self.lock:
+            self.remote[source] = snapshot
+
+    def render(self) -> str:
+        self._collect()
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            for source, (remote_counters, remote_gauges) in self.remote.items():
+                for key, value in remote_counters.items():
+                    counters[key] = counters.get(key, 0) + value
+                for (name, labels), value in remote_gauges.items():
+                    gauges[(name, labels + (('source', source),))] = value
+
+        lines = []
+        for kind, values in (("counter", counters), ("gauge", gauges)):
+            declared = set()
+            for (name, labels), value in sorted(values.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE {name} {kind}")
+                    declared.add(name)
+                label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f"{name}{{{label_str}}} {value:g}" if label_str else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Metrics request from {self.address_string()}: {format % args}")
+
+
+class MetricsServer:
+    """
+    Serves `/metrics` for Prometheus scrapes.
+    """
+
+    def __init__(self, port: int):
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('', self.port), _Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        logger.info(f"Serving metrics on port {self.port}")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        logger.info("MetricsServer stopped.")
@@ -0,0 +1,162 @@
+import json
+import logging
+import threading
+import time
+
+from src.config import Config
+from src.model.model import ContainerRecord
+from src.services.aggregation import LogAggregator
+from src.services.filters import ContainerFilter
+from src.services.log_parser import FORMATS, FormatDetector, detect_level, parse_docker_timestamp
+from src.services.metrics import metrics
+from src.services.scheduling import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Container labels controlling ingestion
+RATE_LIMIT_LABEL = "clogs.rate_limit"
+RATE_LIMIT_MODE_LABEL = "clogs.rate_limit.mode"
+SUMMARY_ONLY_LABEL = "clogs.summary_only"
+FORMAT_LABEL = "clogs.format"
+
+# Attribute holding the timestamp an application wrote into a structured line (ns since epoch)
+APP_TIMESTAMP_ATTRIBUTE = "app_timestamp"
+
+# Ingest modes, set by the resource governor
+FULL = "full"
+SAMPLED = "sampled"  # Only every Config.GOVERNOR_SAMPLE_RATE-th line is kept, warnings and errors are always kept
+SUMMARY = "summary"  # Lines are only aggregated
+PAUSED = "paused"  # The reader blocks, lines wait in the daemon or the log file
+
+
+def create_rate_limiter(container: ContainerRecord) -> RateLimiter | None:
+    labels = container.labels or {}
+    try:
+        rate = float(labels.get(RATE_LIMIT_LABEL, Config.RATE_LIMIT))
+        mode = labels.get(RATE_LIMIT_MODE_LABEL, Config.RATE_LIMIT_MODE)
+        if rate <= 0:
+            return None
+        return RateLimiter(rate, max(rate, Config.RATE_LIMIT_BURST), mode)
+    except ValueError as e:
+        logger.warning(f"Invalid rate limit configuration for {container.name}, not limiting it: {e}")
+        return None
+
+
+class ContainerPipeline:
+    """
+    Ingest stages of one container, shared by the stream and file readers:
+    include/exclude filters -> rate limit -> redaction -> timestamp and level parsing -> structured field extraction
+    -> aggregation -> row for the spool.
+    """
+
+    def __init__(self, container: ContainerRecord, aggregator: LogAggregator | None = None, limiter: RateLimiter | None = None):
+        """
+        :param container: Container whose lines are processed
+        :param aggregator: Aggregator for summaries
+        :param limiter: Rate limiter to use instead of the container's own, e.g. one shared by a backfill
+        """
+        self.container_id = container.id
+        self.name = container.name
+        self.filter = ContainerFilter(container) or None
+        self.limiter = limiter or create_rate_limiter(container)
+
+        # Structured parsing, with the format either forced by label or detected from the first lines
+        self.detector = None
+        if Config.STRUCTURED_PARSING:
+            forced_format = (container.labels or {}).get(FORMAT_LABEL)
+            if forced_format is not None and forced_format not in FORMATS:
+                logger.warning(f"Unknown {FORMAT_LABEL} '{forced_format}' on {container.name}, detecting the format instead")
+                forced_format = None
+            self.detector = FormatDetector(container.name, forced_format)
+
+        # Summary-only containers are aggregated but their raw lines are never spooled
+        self.summary_only = (container.labels or {}).get(SUMMARY_ONLY_LABEL, "").lower() == "true"
+        self.aggregator = aggregator if aggregator and (Config.SUMMARIES or self.summary_only) else None
+        self.summary_aggregator = aggregator
+
+        self.mode = FULL
+        self.resumed = threading.Event()
+        self.resumed.set()
+        self.seen = 0  # Lines read, for the governor's rate estimate
+        self.sampled = 0  # Lines that were candidates for sampling
+        self.shed: dict[str, int] = {}  # mode -> lines not spooled because of it since the last `report`
+
+    def set_mode(self, mode: str):
+        self.mode = mode
+        if mode == PAUSED:
+            self.resumed.clear()
+        else:
+            self.resumed.set()
+
+    def process(self, timestamp_str: str, content: str, stop_event: threading.Event) -> tuple | None:
+        """
+        Runs a raw line through the pipeline.
+        :return: (container_id, timestamp, level, message, attributes json) row to spool, or None if the line is not spooled.
+        """
+        self.seen += 1
+        if self.mode == PAUSED:
+            while not self.resumed.wait(1.0):
+                if stop_event.is_set():
+                    return None
+
+        # Filtered lines are dropped before they cost a rate limit token, parsing or spool I/O
+        if self.filter and not self.filter.keep(content):
+            return None
+        if self.limiter and not self.limiter.admit(stop_event):
+            return None
+        if self.filter:
+            content = self.filter.redact(content)
+
+        try:
+            ts_ns = parse_docker_timestamp(timestamp_str)
+        except ValueError as te:
+            logger.debug(f"Failed to parse docker timestamp '{timestamp_str}', using fallback: {te}")
+            ts_ns = time.time_ns()
+
+        message = content.strip()
+        if self.mode == SUMMARY:
+            # Skips structured parsing, which is the most expensive stage
+            if self.summary_aggregator:
+                self.summary_aggregator.observe(self.container_id, ts_ns, detect_level(content), message)
+            self.shed[SUMMARY] = self.shed.get(SUMMARY, 0) + 1
+            return None
+
+        level = None
+        attributes = None
+        if self.detector:
+            parsed = self.detector.parse(message)
+            if parsed is not None:
+                parsed_ts, level, attributes = parsed
+                # Lines are ordered by the daemon's timestamp: the application's is often coarser, and lines
+                # without one would be ordered by a different clock
+                if parsed_ts is not None:
+                    attributes = {**(attributes or {}), APP_TIMESTAMP_ATTRIBUTE: str(parsed_ts)}
+        level = level or detect_level(content)
+
+        if self.aggregator:
+            self.aggregator.observe(self.container_id, ts_ns, level, message)
+        if self.summary_only:
+            return None
+        if self.mode == SAMPLED and level not in ("ERROR", "WARNING"):
+            self.sampled += 1
+            if self.sampled % Config.GOVERNOR_SAMPLE_RATE:
+                self.shed[SAMPLED] = self.shed.get(SAMPLED, 0) + 1
+                return None
+        return self.container_id, ts_ns, level, message, json.dumps(attributes) if attributes else None
+
+    def report(self):
+        """
+        Logs lines dropped since the last report and publishes filter hits and lines shed by the governor.
+        """
+        if self.limiter:
+            dropped = self.limiter.take_dropped()
+            if dropped:
+                logger.warning(f"Rate limit dropped {dropped} lines from {self.name} ({self.container_id[:12]})")
+                metrics.inc("clogs_rate_limit_dropped_total", dropped, container=self.name)
+        for mode, lines in self.shed.items():
+            if lines:
+                metrics.inc("clogs_governor_shed_lines_total", lines, container=self.name, mode=mode)
+        self.shed = {}
+        if self.filter:
+            for (action, rule), hits in self.filter.take_hits().items():
+                metrics.inc("clogs_filter_hits_total", hits, container=self.name, action=action, rule=rule)
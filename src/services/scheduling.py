@@ -0,0 +1,154 @@
+import threading
+import time
+from typing import Any, Callable
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter.
+    Tokens refill at `rate` per second up to `burst`.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def try_consume(self, n: float = 1) -> bool:
+        """
+        Takes n tokens if available.
+        :return: True if the tokens were taken, False if the caller is over its rate.
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens >= n:
+                self.tokens -= n
+                return True
+            return False
+
+    def reserve(self, n: float = 1) -> float:
+        """
+        Takes n tokens, going into debt if necessary.
+        :return: Seconds the caller has to wait before the reservation is covered.
+        """
+        with self.lock:
+            self._refill()
+            self.tokens -= n
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class DeficitRoundRobin:
+    """
+    Deficit round-robin over containers with pending rows.
+
+    Every visit a container earns `quantum * weight` rows of credit, and may send as many rows as it has credit.
+    Containers are discovered through `next_container(after)`, which returns the next container id (in sort order)
+    that has pending rows, so a round never has to enumerate the whole backlog. The position in the round is kept
+    between batches, so with thousands of containers each batch continues where the previous one stopped.
+    """
+
+    def __init__(self, quantum: int, weight: Callable[[str], float] = lambda container_id: 1.0):
+        self.quantum = quantum
+        self.weight = weight
+        self.deficits: dict[str, float] = {}
+        self.cursor = ""  # Last visited container id
+        self.resume: str | None = None  # Container whose credit was not used up because the batch was full
+
+    def select(self, next_container: Callable[[str], str | None], fetch: Callable[[str, int, Any], list], budget: int) -> list:
+        """
+        Selects the next batch of rows.
+        :param next_container: Returns the first container id greater than the given one that has pending rows, or None.
+        :param fetch: fetch(container_id, n, last) returns up to n of the oldest pending rows of a container,
+                      after `last`, the last row already selected for that container in this batch (or None).
+        :param budget: Maximum number of rows in the batch.
+        :return: Selected rows.
+        """
+        batch = []
+        last_rows = {}  # container id -> last row selected in this batch
+        drained = set()
+        round_start = None  # First container of the current round
+        round_rows = 0
+        while budget > 0:
+            if self.resume is not None:
+                container_id, self.resume = self.resume, None
+            else:
+                container_id = next_container(self.cursor)
+                if container_id is None:
+                    if self.cursor == "":
+                        break  # Nothing pending at all
+                    self.cursor = ""  # Wrap around
+                    continue
+                if container_id == round_start:
+                    if round_rows == 0:
+                        break  # A full round without progress
+                    round_rows = 0
+                if round_start is None:
+                    round_start = container_id
+                if container_id in drained:
+                    self.cursor = container_id
+                    continue
+                self.deficits[container_id] = self.deficits.get(container_id, 0.0) + self.quantum * self.weight(container_id)
+
+            self.cursor = container_id
+            allowance = int(self.deficits.get(container_id, 0.0))
+            if allowance <= 0:
+                continue
+
+            take = min(allowance, budget)
+            rows = fetch(container_id, take, last_rows.get(container_id))
+            if rows:
+                last_rows[container_id] = rows[-1]
+            batch.extend(rows)
+            budget -= len(rows)
+            round_rows += len(rows)
+
+            if len(rows) < take:
+                # Backlog drained, credit does not carry over (standard DRR)
+                self.deficits.pop(container_id, None)
+                drained.add(container_id)
+            else:
+                self.deficits[container_id] -= len(rows)
+                if take < allowance:
+                    self.resume = container_id
+        return batch
+
+
+class RateLimiter:
+    """
+    Per-container ingest rate limit.
+    In "delay" mode excess lines block the reader until tokens are available (backpressure, no loss),
+    in "sample" mode excess lines are dropped and counted.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None, mode: str = "delay"):
+        if mode not in ("delay", "sample"):
+            raise ValueError(f"Unknown rate limit mode: {mode}")
+        self.bucket = TokenBucket(rate, burst)
+        self.mode = mode
+        self.dropped = 0
+
+    def admit(self, stop_event: threading.Event) -> bool:
+        """
+        :return: True if the line should be kept.
+        """
+        if self.mode == "sample":
+            if self.bucket.try_consume():
+                return True
+            self.dropped += 1
+            return False
+
+        wait = self.bucket.reserve()
+        if wait > 0:
+            stop_event.wait(wait)
+        return True
+
+    def take_dropped(self) -> int:
+        dropped, self.dropped = self.dropped, 0
+        return dropped
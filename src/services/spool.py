@@ -0,0 +1,214 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class LogSpool:
+    """
+    Persistent SQLite queue of log rows waiting for upload.
+
+    Rows are acknowledged per container by id watermark (all rows of a container up to the highest uploaded id),
+    which is a ranged delete on the (container_id, id) index instead of a long `IN (...)` list.
+    Retention deletes use an index on timestamp and run in bounded chunks. The database uses incremental
+    auto-vacuum, and `maintain` hands free pages back to the filesystem and checkpoints the WAL in small steps,
+    so the file size stays flat under constant traffic.
+    """
+
+    RETENTION_CHUNK = 5000  # Rows per retention delete transaction
+    VACUUM_THRESHOLD = 1024  # Free pages before an incremental vacuum is worth it
+    VACUUM_STEP = 4096  # Maximum pages released per maintenance run
+    WAL_SIZE_LIMIT = 64 * 1024 * 1024  # Bytes the WAL is truncated to after checkpoints
+
+    TABLES = ("pending_logs", "backfill_logs")
+
+    def __init__(self, db_path: str, table: str = "pending_logs"):
+        """
+        :param db_path: Path of the SQLite database
+        :param table: Queue to operate on, `pending_logs` for live rows or `backfill_logs` for historical rows,
+                      which are sent with lower priority. Both live in the same database.
+        """
+        if table not in self.TABLES:
+            raise ValueError(f"Unknown spool table: {table}")
+        self.db_path = db_path
+        self.table = table
+        self._local = threading.local()
+        self._init_db()
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            # auto_vacuum has to be set before the first table exists, or be applied with a full VACUUM
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                logger.info("Migrating log spool to incremental auto-vacuum, this may take a moment...")
+                conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                conn.execute('VACUUM')
+
+            # Enable WAL mode for better concurrency
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'PRAGMA journal_size_limit={self.WAL_SIZE_LIMIT}')
+
+            with conn:
+                for table in self.TABLES:
+                    conn.execute(f'''
+                        CREATE TABLE IF NOT EXISTS {table} (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            container_id TEXT,
+                            timestamp INTEGER,
+                            level TEXT,
+                            message TEXT,
+                            attributes TEXT
+                        )
+                    ''')
+                    # Spools created before structured parsing lack the attributes column
+                    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+                    if 'attributes' not in columns:
+                        conn.execute(f'ALTER TABLE {table} ADD COLUMN attributes TEXT')
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_container_id ON {table}(container_id)')
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_timestamp ON {table}(timestamp)')
+
+                # Byte-offset checkpoints for json-file tailing
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS tail_checkpoints (
+                        container_id TEXT PRIMARY KEY,
+                        inode INTEGER,
+                        offset INTEGER
+                    )
+                ''')
+        finally:
+            conn.close()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """
+        Connection of the calling thread. SQLite connections must not be shared between threads.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Wait up to 5 seconds for locks held by other threads/processes to clear
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute(f'PRAGMA journal_size_limit={self.WAL_SIZE_LIMIT}')
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """
+        Closes the calling thread's connection.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    ### Ingestion ###
+
+    def insert(self, rows: list[tuple], *checkpoints: tuple[str, int, int] | None):
+        """
+        Appends rows, optionally storing tail checkpoints in the same transaction.
+        :param rows: (container_id, timestamp, level, message, attributes json) tuples
+        :param checkpoints: (container_id, inode, offset) of tailed log files
+        """
+        with self.conn as conn:
+            conn.executemany(
+                f'INSERT INTO {self.table} (container_id, timestamp, level, message, attributes) VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO tail_checkpoints (container_id, inode, offset) VALUES (?, ?, ?)',
+                [checkpoint for checkpoint in checkpoints if checkpoint]
+            )
+
+    def get_checkpoint(self, container_id: str) -> tuple[int, int] | None:
+        return self.conn.execute('SELECT inode, offset FROM tail_checkpoints WHERE container_id = ?', (container_id,)).fetchone()
+
+    def prune_checkpoints(self, keep: Callable[[str], bool]):
+        with self.conn as conn:
+            for (container_id,) in conn.execute('SELECT container_id FROM tail_checkpoints').fetchall():
+                if not keep(container_id):
+                    conn.execute('DELETE FROM tail_checkpoints WHERE container_id = ?', (container_id,))
+
+    ### Sending ###
+
+    def next_container(self, after: str) -> str | None:
+        """
+        :return: The first container id greater than `after` that has pending rows (an index seek, not a scan).
+        """
+        row = self.conn.execute(
+            f'SELECT container_id FROM {self.table} WHERE container_id > ? ORDER BY container_id LIMIT 1',
+            (after,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def has_rows(self, container_id: str) -> bool:
+        return self.conn.execute(f'SELECT 1 FROM {self.table} WHERE container_id = ? LIMIT 1', (container_id,)).fetchone() is not None
+
+    def fetch(self, container_id: str, limit: int, after_id: int = 0) -> list[tuple]:
+        """
+        :return: Up to `limit` of the oldest (id, container_id, timestamp, level, message, attributes) rows of a container.
+        """
+        return self.conn.execute(
+            f'SELECT id, container_id, timestamp, level, message, attributes FROM {self.table} WHERE container_id = ? AND id > ? ORDER BY id LIMIT ?',
+            (container_id, after_id, limit)
+        ).fetchall()
+
+    def ack(self, watermarks: dict[str, int]):
+        """
+        Deletes uploaded rows.
+        Rows are always fetched oldest first per container, so everything up to the highest uploaded id was sent.
+        :param watermarks: container id -> highest uploaded row id
+        """
+        with self.conn as conn:
+            conn.executemany(
+                f'DELETE FROM {self.table} WHERE container_id = ? AND id <= ?',
+                watermarks.items()
+            )
+
+    def ack_head(self, counts: dict[str, int]):
+        """
+        Deletes the oldest rows of containers, for uploads whose rows were spooled while in flight.
+        :param counts: container id -> number of uploaded rows
+        """
+        with self.conn as conn:
+            conn.executemany(
+                f'DELETE FROM {self.table} WHERE id IN (SELECT id FROM {self.table} WHERE container_id = ? ORDER BY id LIMIT ?)',
+                counts.items()
+            )
+
+    ### Maintenance ###
+
+    def prune(self, threshold_ns: int) -> int:
+        """
+        Deletes rows older than the threshold, in chunks to keep write locks short.
+        :return: Number of deleted rows
+        """
+        deleted = 0
+        conn = self.conn
+        while True:
+            with conn:
+                cursor = conn.execute(
+                    f'DELETE FROM {self.table} WHERE id IN (SELECT id FROM {self.table} WHERE timestamp < ? LIMIT ?)',
+                    (threshold_ns, self.RETENTION_CHUNK)
+                )
+            deleted += cursor.rowcount
+            if cursor.rowcount < self.RETENTION_CHUNK:
+                return deleted
+
+    def maintain(self, idle: bool = False):
+        """
+        Releases free pages and checkpoints the WAL.
+        :param idle: The queue is empty, so the WAL can be fully truncated without competing with readers.
+        """
+        conn = self.conn
+        free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if free_pages >= self.VACUUM_THRESHOLD:
+            # executescript runs the pragma to completion, execute() would stop after the first page
+            conn.executescript(f'PRAGMA incremental_vacuum({min(free_pages, self.VACUUM_STEP)});')
+            logger.debug(f"Incremental vacuum released up to {min(free_pages, self.VACUUM_STEP)} of {free_pages} free pages")
+
+        busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({'TRUNCATE' if idle else 'PASSIVE'})").fetchone()
+        if busy:
+            logger.debug(f"WAL checkpoint was blocked, {checkpointed}/{log_frames} frames checkpointed")
@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+
+from src.api import APIClient
+from src.config import Config
+from src.docker_api import STREAM, get_client
+from src.model.api import ContainerStatusChange, ContainerStatusTransfer
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Docker events that change the status or health of a container. health_status matches "health_status: <state>".
+EVENT_FILTERS = {"type": ["container"], "event": ["create", "start", "die", "oom", "pause", "unpause", "health_status"]}
+EVENT_STATUSES = {"create": "created", "start": "running", "die": "exited", "pause": "paused", "unpause": "running"}
+RECONNECT_DELAY = 5
+
+
+class StatusTracker:
+    """
+    Tracks the status of registered containers from the Docker event stream of every endpoint, so short restarts
+    between discovery cycles are not missed, and records exit codes, OOM kills and health check results with
+    the exact time of the transition.
+
+    Transitions are queued and uploaded in batches every `Config.STATUS_FLUSH_INTERVAL`. Backends without the batch
+    endpoint get per-container status updates. While the event stream of an endpoint is down, statuses seen by the
+    discovery poll (`observe`) are reported instead. After a reconnect, the stream resumes at the last received event.
+    """
+
+    def __init__(self, api_client: APIClient, agent_id: str, endpoints: list[str]):
+        self.api_client = api_client
+        self.agent_id = agent_id
+        self.endpoints = endpoints
+        self.statuses: dict[str, str] = {}  # container id -> last known status, for registered containers only
+        self.health: dict[str, str] = {}  # container id -> last known health
+        self.oom: set[str] = set()  # Containers with an OOM kill since their last start
+        self.pending: list[ContainerStatusChange] = []
+        self.connected: set[str] = set()  # Endpoints whose event stream is up
+        self.streams = {}  # endpoint -> open event stream
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def start(self):
+        if Config.STATUS_EVENTS:
+            for endpoint in self.endpoints:
+                thread = threading.Thread(target=self._watch, args=(endpoint,), name=f"events-{endpoint}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        thread = threading.Thread(target=self._flush_loop, name="status-flush", daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def stop(self):
+        self.stop_event.set()
+        with self.lock:
+            streams = list(self.streams.values())
+        for stream in streams:
+            try:
+                stream.close()
+            except Exception as e:
+                logger.debug(f"Failed to close event stream: {e}")
+        for thread in self.threads:
+            thread.join()
+        logger.info("Status Tracker stopped.")
+
+    def track(self, container_id: str, status: str):
+        """
+        Starts tracking a registered container, whose current status is known to the backend.
+        """
+        with self.lock:
+            self.statuses[container_id] = status
+
+    def forget(self, container_id: str):
+        with self.lock:
+            self.statuses.pop(container_id, None)
+            self.health.pop(container_id, None)
+            self.oom.discard(container_id)
+
+    def observe(self, container_id: str, status: str, endpoint: str):
+        """
+        Status of a container as seen by a discovery poll. Only reported while the endpoint's event stream is down,
+        otherwise the events are authoritative and the poll may lag behind them.
+        """
+        with self.lock:
+            if endpoint in self.connected:
+                return
+            self._record(container_id, status, time.time_ns())
+
+    def _record(self, container_id: str, status: str, timestamp: int, exit_code: int | None = None,
+                oom_killed: bool = False, health: str | None = None):
+        previous = self.statuses.get(container_id)
+        if previous is None:
+            return  # Not registered (yet), registration reports the initial status
+        if status == previous and exit_code is None and not oom_killed and (health is None or health == self.health.get(container_id)):
+            return
+        self.statuses[container_id] = status
+        if health is not None:
+            self.health[container_id] = health
+        self.pending.append(ContainerStatusChange(
+            container_id=container_id, status=status, timestamp=timestamp,
+            exit_code=exit_code, oom_killed=oom_killed, health=health,
+        ))
+        if len(self.pending) > Config.STATUS_BACKLOG:
+            dropped = len(self.pending) - Config.STATUS_BACKLOG
+            logger.warning(f"Status backlog is full, dropping {dropped} oldest transitions")
+            del self.pending[:dropped]
+        metrics.inc("clogs_container_transitions_total", status=status)
+
+    def _handle(self, event: dict):
+        action = event.get("Action") or event.get("status", "")
+        container_id = event.get("id") or event.get("Actor", {}).get("ID")
+        attributes = event.get("Actor", {}).get("Attributes", {})
+        timestamp = event.get("timeNano") or event.get("time", 0) * 10**9
+
+        logger.debug(f"Container {attributes.get('name', container_id)}: {action}")
+        with self.lock:
+            if action == "oom":
+                # Reported right away, since a process other than the main one may have been killed, and again on exit
+                self.oom.add(container_id)
+                self._record(container_id, self.statuses.get(container_id, "running"), timestamp, oom_killed=True)
+            elif action == "die":
+                exit_code = attributes.get("exitCode")
+                self._record(container_id, "exited", timestamp, int(exit_code) if exit_code is not None else None,
+                             oom_killed=container_id in self.oom)
+                self.oom.discard(container_id)
+            elif action in EVENT_STATUSES:
+                self._record(container_id, EVENT_STATUSES[action], timestamp)
+            elif action.startswith("health_status"):
+                health = action.partition(":")[2].strip()
+                self._record(container_id, self.statuses.get(container_id, "running"), timestamp, health=health)
+
+    def _watch(self, endpoint: str):
+        since = time.time()
+        last_event = 0  # timeNano of the last handled event, to skip events replayed after a reconnect
+        while not self.stop_event.is_set():
+            try:
+                events = get_client(endpoint, STREAM).api.events(since=int(since), filters=EVENT_FILTERS, decode=True)
+                with self.lock:
+                    self.streams[endpoint] = events
+                    self.connected.add(endpoint)
+                logger.info(f"Watching container events of {endpoint}")
+                for event in events:
+                    timestamp = event.get("timeNano", 0)
+                    if timestamp and timestamp <= last_event:
+                        continue
+                    last_event = timestamp
+                    since = timestamp / 10**9
+                    self._handle(event)
+            except Exception as e:
+                if not self.stop_event.is_set():
+                    logger.warning(f"Container event stream of {endpoint} failed, polling statuses until it is back: {e}")
+            finally:
+                with self.lock:
+                    self.streams.pop(endpoint, None)
+                    self.connected.discard(endpoint)
+            self.stop_event.wait(RECONNECT_DELAY)
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(Config.STATUS_FLUSH_INTERVAL):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        with self.lock:
+            changes, self.pending = self.pending, []
+        if not changes:
+            return
+
+        sent = self.api_client.update_container_statuses(self.agent_id, ContainerStatusTransfer(agent_id=self.agent_id, changes=changes))
+        unsent = []
+        if sent is None:
+            for index, change in enumerate(changes):
+                # The per-container endpoint only knows statuses, health and OOM-only changes are skipped
+                if change.health is not None or (change.oom_killed and change.exit_code is None):
+                    continue
+                if not self.api_client.update_container_status(self.agent_id, change.container_id, change.status, change.timestamp // 10**9):
+                    unsent = changes[index:]
+                    break
+        elif not sent:
+            unsent = changes
+
+        if unsent:
+            # Retried in order before newer transitions
+            with self.lock:
+                self.pending[:0] = unsent
+                if len(self.pending) > Config.STATUS_BACKLOG:
+                    del self.pending[:len(self.pending) - Config.STATUS_BACKLOG]
@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable
+
+from src.config import Config
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Stage:
+    __slots__ = ('timeout', 'busy', 'waiting', 'progress', 'stalled')
+
+    def __init__(self, timeout: float, busy: Callable[[], bool] | None, waiting: Callable[[], float | None] | None):
+        self.timeout = timeout
+        self.busy = busy
+        self.waiting = waiting
+        self.progress = time.monotonic()
+        self.stalled = False
+
+
+class Watchdog:
+    """
+    Liveness of the agent's pipeline stages, reported through the health file read by the container HEALTHCHECK.
+
+    Stages report progress with `beat`, which only stores a timestamp. A stage is stalled when it made no progress
+    for longer than its timeout while it had work to do: stages without a `busy` check always have work, the
+    others are legitimately idle while `busy()` is False, which counts as progress. Stages made of independent
+    units of work, such as log readers, report since when their oldest unit waits with `waiting` instead, so one
+    unit making progress does not hide another that is stuck. Every `Config.WATCHDOG_INTERVAL`, the health file
+    is rewritten with the current time if no stage is stalled, so it goes stale, and the container unhealthy,
+    once a stage stalls.
+    """
+
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+        self.stages: dict[str, _Stage] = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def register(self, name: str, timeout: float, busy: Callable[[], bool] | None = None,
+                 waiting: Callable[[], float | None] | None = None):
+        """
+        :param name: Name of the stage, used in logs and metrics
+        :param timeout: Seconds without progress after which the stage is stalled
+        :param busy: Whether the stage has work to do, None if it always has
+        :param waiting: Monotonic time since which the oldest unit of work of the stage waits without progress,
+                        None if none does. Replaces `beat` and `busy`.
+        """
+        self.stages[name] = _Stage(timeout, busy, waiting)
+
+    def unregister(self, name: str):
+        self.stages.pop(name, None)
+
+    def beat(self, name: str):
+        stage = self.stages.get(name)
+        if stage is not None:
+            stage.progress = time.monotonic()
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, name="watchdog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        # A stopped agent is not healthy, even before the file goes stale
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def _loop(self):
+        while True:
+            try:
+                if not self.check():
+                    self._write()
+            except Exception as e:
+                logger.error(f"Error in watchdog: {e}")
+            if self.stop_event.wait(self.interval):
+                break
+
+    def check(self) -> list[str]:
+        """
+        :return: Names of the stalled stages
+        """
+        now = time.monotonic()
+        stalled = []
+        for name, stage in list(self.stages.items()):
+            if stage.waiting is not None:
+                waiting = stage.waiting()
+                stage.progress = now if waiting is None else waiting
+            elif stage.busy is not None and not stage.busy():
+                # Idle counts as progress, so work that starts after a long idle period gets the full timeout
+                stage.progress = now
+            age = now - stage.progress
+            metrics.set("clogs_watchdog_progress_age_seconds", age, stage=name)
+            if age > stage.timeout:
+                stalled.append(name)
+                if not stage.stalled:
+                    logger.error(f"Watchdog: {name} stalled, no progress for {age:.0f}s")
+                    stage.stalled = True
+            elif stage.stalled:
+                logger.info(f"Watchdog: {name} recovered")
+                stage.stalled = False
+        metrics.set("clogs_watchdog_healthy", 0 if stalled else 1)
+        return stalled
+
+    def _write(self):
+        # Written to a temporary file and renamed, so the HEALTHCHECK never reads a partial timestamp
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(f"{time.time():.3f}")
+        os.replace(tmp_path, self.path)
+
+
+watchdog = Watchdog(Config.HEALTH_FILE, Config.WATCHDOG_INTERVAL)
@@ -0,0 +1,249 @@
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+import zlib
+
+from src.config import Config
+from src.model.model import ContainerRecord
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+METRICS_INTERVAL = 10  # Seconds between metrics snapshots and health reports sent to the parent
+HEALTH_GRACE = 3 * METRICS_INTERVAL  # Seconds without a health report after which a worker counts as stuck
+
+
+def _worker_main(index: int, agent_id: str, commands: multiprocessing.Queue, results: multiprocessing.Queue, parent_pid: int):
+    """
+    Entry point of a worker process.
+    Runs an ingest-only LogCollector (stream readers and parsers, no sender) for the
+    containers assigned to this worker. Rows are written to the shared SQLite spool,
+    which the parent's sender drains. Summaries are uploaded by the worker itself,
+    metrics snapshots and health reports are sent to the parent over the results queue.
+    """
+    # The parent handles termination signals and tells us to stop via the command queue
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=Config.LOG_LEVEL, format=f'%(asctime)s - worker-{index} - %(name)s - %(levelname)s - %(message)s')
+
+    from src.api import APIClient
+    from src.services.log_collector import LogCollector
+
+    collector = LogCollector(APIClient(), agent_id, ingest_only=True)
+    collector.start()
+
+    last_metrics = time.time()
+    while True:
+        if time.time() - last_metrics >= METRICS_INTERVAL:
+            results.put(("metrics", index, metrics.snapshot()))
+            # Monotonic clocks are shared by the processes of a host
+            results.put(("health", index, (time.monotonic(), collector.ingest_waiting())))
+            last_metrics = time.time()
+        try:
+            command, payload = commands.get(timeout=1)
+        except queue.Empty:
+            if os.getppid() != parent_pid:
+                logger.warning("Parent process is gone, stopping worker.")
+                break
+            continue
+
+        if command == "stop":
+            break
+
+        if command == "assign":
+            containers, resume = payload
+            collector.update_monitored_containers(containers, resume=resume)
+
+        if command == "governor":
+            collector.governor.set_level(payload)
+
+        if command == "flush_interval":
+            collector.batching.set_flush_interval(payload)
+
+    collector.stop()
+
+
+class WorkerPool:
+    """
+    Shards monitored containers across a pool of worker processes.
+
+    Sharding strategies:
+    - "hash": rendezvous hashing, a container always maps to the same worker and
+      only containers that come or go cause work.
+    - "balanced": sticky least-loaded placement, new containers go to the worker with
+      the fewest containers, and containers are moved off overloaded workers when the
+      spread between workers grows beyond one container.
+
+    Streams of containers that moved to another worker, or whose worker was restarted, continue at the position
+    their previous reader committed to the spool, so lines written during the handoff are not lost.
+    """
+
+    def __init__(self, agent_id: str, size: int, strategy: str = "balanced"):
+        if strategy not in ("balanced", "hash"):
+            raise ValueError(f"Unknown worker sharding strategy: {strategy}")
+        self.agent_id = agent_id
+        self.size = size
+        self.strategy = strategy
+        self.context = multiprocessing.get_context("spawn")
+        self.processes: list[multiprocessing.Process | None] = [None] * size
+        self.queues: list[multiprocessing.Queue | None] = [None] * size
+        self.assignments: dict[str, int] = {}  # container id -> worker index
+        self.sent: list[frozenset[tuple[str, str]] | None] = [None] * size  # last (id, status) pairs sent to each worker
+        self.resume: set[str] = set()  # Containers whose new reader continues at the previous reader's position
+        self.results = self.context.Queue()  # (kind, worker index, payload) messages from the workers
+        self.reported: list[float] = [0.0] * size  # Monotonic time of each worker's last health report, or start
+        self.waiting: list[float | None] = [None] * size  # Since when each worker's ingestion waits, as last reported
+        self.governor_level = 0  # Degradation level of the parent's resource governor, followed by the workers
+        self.flush_interval: float | None = None  # Adaptive flush interval of the parent's sender, followed by the workers
+
+    def start(self):
+        for index in range(self.size):
+            self._spawn(index)
+        logger.info(f"Started {self.size} log worker processes (sharding: {self.strategy})")
+
+    def stop(self):
+        for index, commands in enumerate(self.queues):
+            if commands is not None and self._alive(index):
+                commands.put(("stop", None))
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(timeout=10)
+            if process.is_alive():
+                logger.warning(f"Worker process {process.pid} did not stop in time, terminating")
+                process.terminate()
+                process.join()
+        logger.info("WorkerPool stopped.")
+
+    def check_workers(self) -> bool:
+        """
+        Collects the results of the workers and restarts dead ones.
+        :return: Whether a worker was restarted, which then needs its assignment
+        """
+        self._collect_results()
+        restarted = False
+        for index in range(self.size):
+            if not self._alive(index):
+                logger.warning(f"Worker process {index} died, restarting it")
+                self._spawn(index)
+                self.resume.update(cid for cid, assigned in self.assignments.items() if assigned == index)
+                restarted = True
+        return restarted
+
+    def ingest_waiting(self) -> float | None:
+        """
+        :return: Monotonic time since which the ingestion of a worker waits without progress, or since which a
+                 worker is overdue with its health report (hung, or dead and not restarted yet). None if no worker
+                 is held up.
+        """
+        self._collect_results()
+        now = time.monotonic()
+        waiting = [since for since in self.waiting if since is not None]
+        waiting.extend(reported + HEALTH_GRACE for reported in self.reported if reported + HEALTH_GRACE < now)
+        return min(waiting, default=None)
+
+    def update_monitored_containers(self, containers: list[ContainerRecord]):
+        self.check_workers()
+
+        container_ids = set(c.id for c in containers)
+        if self.strategy == "hash":
+            self.assignments = {cid: self._hash_shard(cid) for cid in container_ids}
+        else:
+            self._balance(container_ids)
+
+        records = {c.id: c for c in containers}
+        shards: list[set[str]] = [set() for _ in range(self.size)]
+        for container_id, index in self.assignments.items():
+            shards[index].add(container_id)
+
+        for index, shard in enumerate(shards):
+            # Workers hold copies of the records, so a shard is sent again when a status changed: readers of
+            # containers that were not running are only restarted once the worker knows they run
+            sent = frozenset((container_id, records[container_id].status) for container_id in shard)
+            if self.sent[index] != sent:
+                # Records are small and picklable, so workers need no Docker lookups of their own
+                resume = [container_id for container_id in shard if container_id in self.resume]
+                self.queues[index].put(("assign", ([records[container_id] for container_id in shard], resume)))
+                self.sent[index] = sent
+                self.resume.difference_update(resume)
+        self.resume.intersection_update(self.assignments)
+
+    def set_governor_level(self, level: int):
+        self.governor_level = level
+        for index, commands in enumerate(self.queues):
+            if commands is not None and self._alive(index):
+                commands.put(("governor", level))
+
+    def set_flush_interval(self, interval: float):
+        self.flush_interval = interval
+        for index, commands in enumerate(self.queues):
+            if commands is not None and self._alive(index):
+                commands.put(("flush_interval", interval))
+
+    def _spawn(self, index: int):
+        commands = self.context.Queue()
+        process = self.context.Process(
+            target=_worker_main,
+            args=(index, self.agent_id, commands, self.results, os.getpid()),
+            name=f"clogs-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+        self.queues[index] = commands
+        self.sent[index] = None  # Force a full re-send of the assignment
+        self.reported[index] = time.monotonic()
+        self.waiting[index] = None
+        if self.governor_level:
+            commands.put(("governor", self.governor_level))
+        if self.flush_interval is not None:
+            commands.put(("flush_interval", self.flush_interval))
+
+    def _collect_results(self):
+        while True:
+            try:
+                kind, index, payload = self.results.get_nowait()
+            except queue.Empty:
+                return
+            if kind == "metrics":
+                metrics.merge(f"worker-{index}", payload)
+            elif kind == "health":
+                reported, waiting = payload
+                if reported > self.reported[index]:  # Not a late report of a worker that was replaced
+                    self.reported[index], self.waiting[index] = reported, waiting
+
+    def _alive(self, index: int) -> bool:
+        process = self.processes[index]
+        return process is not None and process.is_alive()
+
+    def _hash_shard(self, container_id: str) -> int:
+        return max(range(self.size), key=lambda i: zlib.crc32(f"{i}:{container_id}".encode()))
+
+    def _balance(self, container_ids: set[str]):
+        # Forget containers that are gone
+        for container_id in set(self.assignments) - container_ids:
+            del self.assignments[container_id]
+
+        loads = [0] * self.size
+        for index in self.assignments.values():
+            loads[index] += 1
+
+        # Place new containers on the least loaded worker
+        for container_id in sorted(container_ids - set(self.assignments)):
+            index = loads.index(min(loads))
+            self.assignments[container_id] = index
+            loads[index] += 1
+
+        # Rebalance if removals left the pool lopsided
+        while max(loads) - min(loads) > 1:
+            source = loads.index(max(loads))
+            target = loads.index(min(loads))
+            container_id = next(cid for cid, index in self.assignments.items() if index == source)
+            logger.debug(f"Moving container {container_id[:12]} from worker {source} to worker {target}")
+            self.assignments[container_id] = target
+            self.resume.add(container_id)
+            loads[source] -= 1
+            loads[target] += 1
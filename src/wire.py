@@ -0,0 +1,186 @@
+"""
+Compact columnar encoding for log batches (content type `application/vnd.clogs.columnar.v1`).
+
+Compared to the JSON `MultiContainerLogTransfer`, field names are not repeated per row, timestamps are
+delta encoded, levels are dictionary encoded and messages are length prefixed. Encoding is streaming:
+`encode_batch` yields one container block at a time, so a batch is never materialised as a whole.
+
+Layout (all integers are LEB128 varints, `svarint` is zigzag encoded):
+
+    batch      := "CLG1" str(agent_id) block* uvarint(0)
+    block      := uvarint(row_count > 0) str(container_id) u8(flags) timestamps levels messages [attributes]
+    timestamps := svarint(ts[0]) svarint(ts[1] - ts[0]) ... svarint(ts[n-1] - ts[n-2])   (nanoseconds)
+    levels     := level{row_count}
+    level      := uvarint(index), where index == size of the level dictionary appends str(level) to it.
+                  The dictionary is shared by all blocks of a batch.
+    messages   := str{row_count}
+    str        := uvarint(byte length) utf-8 bytes
+
+`flags` announces optional columns following the messages column, decoders must reject unknown flags:
+
+    0x01 attributes := row_attributes{row_count}
+         row_attributes := uvarint(pair_count) (key str(value)){pair_count}
+         key        := uvarint(index), dictionary encoded like levels, with its own batch-wide dictionary
+"""
+from typing import Iterable, Iterator, Sequence
+
+from src.model.api import Log, MultiContainerLogTransfer, MultilineLogTransfer
+
+CONTENT_TYPE = "application/vnd.clogs.columnar.v1"
+MAGIC = b"CLG1"
+FLAG_ATTRIBUTES = 0x01
+
+# (timestamp, level, message, attributes or None)
+Row = tuple[int, str, str, dict[str, str] | None]
+
+
+def _uvarint(value: int, out: bytearray):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _svarint(value: int, out: bytearray):
+    _uvarint((value << 1) ^ (value >> 63), out)
+
+
+def _str(value: str, out: bytearray):
+    data = value.encode('utf-8')
+    _uvarint(len(data), out)
+    out += data
+
+
+def _indexed(value: str, dictionary: dict[str, int], out: bytearray):
+    index = dictionary.get(value)
+    if index is None:
+        index = dictionary[value] = len(dictionary)
+        _uvarint(index, out)
+        _str(value, out)
+    else:
+        _uvarint(index, out)
+
+
+def encode_batch(agent_id: str, blocks: Iterable[tuple[str, Sequence[Row]]]) -> Iterator[bytes]:
+    """
+    Encodes a batch of logs.
+    :param agent_id: ID of the agent
+    :param blocks: (container_id, rows) pairs, rows being (timestamp, level, message, attributes) tuples
+    :return: Iterator over encoded chunks, suitable as a streaming request body
+    """
+    out = bytearray(MAGIC)
+    _str(agent_id, out)
+    yield bytes(out)
+
+    levels: dict[str, int] = {}
+    keys: dict[str, int] = {}
+    for container_id, rows in blocks:
+        if not rows:
+            continue
+        out = bytearray()
+        _uvarint(len(rows), out)
+        _str(container_id, out)
+        flags = FLAG_ATTRIBUTES if any(row[3] for row in rows) else 0
+        out.append(flags)
+
+        previous = 0
+        for timestamp, _, _, _ in rows:
+            _svarint(timestamp - previous, out)
+            previous = timestamp
+
+        for _, level, _, _ in rows:
+            _indexed(level, levels, out)
+
+        for _, _, message, _ in rows:
+            _str(message, out)
+
+        if flags & FLAG_ATTRIBUTES:
+            for _, _, _, attributes in rows:
+                attributes = attributes or {}
+                _uvarint(len(attributes), out)
+                for key, value in attributes.items():
+                    _indexed(key, keys, out)
+                    _str(value, out)
+        yield bytes(out)
+
+    yield b"\x00"
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def uvarint(self) -> int:
+        result = shift = 0
+        while True:
+            byte = self.data[self.pos]
+            self.pos += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def svarint(self) -> int:
+        value = self.uvarint()
+        return (value >> 1) ^ -(value & 1)
+
+    def str(self) -> str:
+        length = self.uvarint()
+        value = self.data[self.pos:self.pos + length].decode('utf-8')
+        self.pos += length
+        return value
+
+    def indexed(self, dictionary: list[str]) -> str:
+        index = self.uvarint()
+        if index == len(dictionary):
+            dictionary.append(self.str())
+        return dictionary[index]
+
+
+def decode_batch(data: bytes) -> MultiContainerLogTransfer:
+    """
+    Decodes a columnar batch back into its JSON model, e.g. for backends or tests.
+    :raise: ValueError: If the data is not a valid v1 batch
+    """
+    if not data.startswith(MAGIC):
+        raise ValueError("Not a columnar log batch")
+    reader = _Reader(data)
+    reader.pos = len(MAGIC)
+    agent_id = reader.str()
+
+    levels: list[str] = []
+    keys: list[str] = []
+    container_logs = []
+    try:
+        while row_count := reader.uvarint():
+            container_id = reader.str()
+            flags = reader.data[reader.pos]
+            reader.pos += 1
+            if flags & ~FLAG_ATTRIBUTES:
+                raise ValueError(f"Unsupported column flags {flags:#x}")
+
+            timestamps = []
+            previous = 0
+            for _ in range(row_count):
+                previous += reader.svarint()
+                timestamps.append(previous)
+
+            row_levels = [reader.indexed(levels) for _ in range(row_count)]
+            messages = [reader.str() for _ in range(row_count)]
+
+            row_attributes = [None] * row_count
+            if flags & FLAG_ATTRIBUTES:
+                for i in range(row_count):
+                    pairs = reader.uvarint()
+                    row_attributes[i] = {reader.indexed(keys): reader.str() for _ in range(pairs)} or None
+
+            logs = [
+                Log(container_id=container_id, timestamp=timestamp, level=level, message=message, attributes=attributes)
+                for timestamp, level, message, attributes in zip(timestamps, row_levels, messages, row_attributes)
+            ]
+            container_logs.append(MultilineLogTransfer(container_id=container_id, logs=logs))
+    except IndexError:
+        raise ValueError("Truncated columnar log batch")
+
+    return MultiContainerLogTransfer(agent_id=agent_id, container_logs=container_logs)